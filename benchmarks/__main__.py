@@ -0,0 +1,190 @@
+"""Time the core operations against a synthetic database.
+
+Usage: python -m benchmarks [--stores N] [--employees M] [--years Y]
+                            [--engine json|journal|sharded|sqlite] [--output FILE]
+                            [--metrics]
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date as dt
+from typing import Callable
+
+from databases import Employees, Metrics, SalesReports, SalesRollups, Stores
+from databases.database import Database
+from databases.printing import PrintSpooler
+from databases.render_cache import RenderCache
+from databases.storages import CachedJSONStorage, JournalStorage
+from helpers import get_today_date
+from models.sales_report import Counts, MoneyCount, Movements, Schedule
+
+from .generator import SyntheticData
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENGINES = {
+    "json": ("tinydb", CachedJSONStorage, "database.json", False),
+    "journal": ("tinydb", JournalStorage, "database.json", False),
+    "sharded": ("tinydb", CachedJSONStorage, "database.json", True),
+    "sqlite": ("sqlite", None, "database.sqlite", False),
+}
+
+
+class Benchmark:
+    """Collects the latency of every timed call, by operation."""
+
+    def __init__(self):
+        self.timings: dict[str, list[float]] = {}
+
+    def time(self, operation: str, call: Callable, *args, **kwargs):
+        start = time.perf_counter()
+        result = call(*args, **kwargs)
+        elapsed = (time.perf_counter() - start) * 1000
+        self.timings.setdefault(operation, []).append(elapsed)
+        return result
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        summary = {}
+        for operation, timings in self.timings.items():
+            ordered = sorted(timings)
+            summary[operation] = {
+                "runs": len(timings),
+                "total_ms": round(sum(timings), 3),
+                "mean_ms": round(statistics.fmean(timings), 3),
+                "median_ms": round(statistics.median(timings), 3),
+                # Nearest rank, so p95 is never below the median
+                "p95_ms": round(ordered[math.ceil(0.95 * len(ordered)) - 1], 3),
+                "min_ms": round(ordered[0], 3),
+                "max_ms": round(ordered[-1], 3),
+            }
+        return summary
+
+
+def seed(data: SyntheticData):
+    """Fill the open database with the synthetic rows and their rollups."""
+    with Database().batch():
+        Database().table("employees").insert_multiple(data.employee_rows())
+        Database().table("stores").insert_multiple(data.store_rows())
+        Database().table("sales_reports").insert_multiple(data.sales_report_rows())
+    SalesRollups().rebuild()
+
+
+def run(args: argparse.Namespace, directory: str) -> dict:
+    data = SyntheticData(args.stores, args.employees, args.years, seed=args.seed)
+    backend, storage, file_name, sharded = ENGINES[args.engine]
+    Database.open(os.path.join(directory, file_name), storage, backend, sharded)
+    benchmark = Benchmark()
+    rng = random.Random(args.seed)
+
+    benchmark.time("seed", seed, data)
+    if args.metrics:
+        Metrics.enable()
+
+    employees = Employees()
+    for n in range(args.runs):
+        benchmark.time(
+            "employees.add", employees.add, f"Bench {n}", f"B{n}", f"bench-{n}"
+        )
+
+    stores = Stores()
+    for _ in range(args.runs * 10):
+        benchmark.time("stores.get", stores.get, rng.randint(1, args.stores))
+
+    # Open and close today's report of every store with generated counts
+    sales_reports = SalesReports()
+    staff = {employee.id: employee for employee in employees.list}
+    template = next(data.sales_report_rows())
+    for store in stores.list:
+        benchmark.time(
+            "sales_reports.open",
+            sales_reports.open,
+            store,
+            Schedule.from_dict(template["schedule"], staff),
+            MoneyCount.from_dict(template["money_open"]),
+            Counts.from_dict(template["counts_open"]),
+        )
+    today = dt.fromisoformat(get_today_date())
+    for sales_report in list(sales_reports.find(date_from=today, date_to=today)):
+        benchmark.time(
+            "sales_reports.close",
+            sales_reports.close,
+            sales_report,
+            MoneyCount.from_dict(template["money_close"]),
+            Counts.from_dict(template["counts_close"]),
+            Movements.from_dict(template["returns"]),
+            Movements.from_dict(template["sales"]),
+        )
+
+    for _ in range(3):
+        reports = benchmark.time(
+            "sales_report_list", lambda: sales_reports.sales_report_list
+        )
+
+    # Render into an empty cache, then again from it, without printing
+    SalesReports.render_cache = RenderCache(os.path.join(directory, "report_cache"))
+    SalesReports.spooler = PrintSpooler(command=lambda file_names, printer: None)
+    sample = rng.sample(reports, min(args.renders, len(reports)))
+    for sales_report in sample:
+        benchmark.time("generate_report", sales_reports.generate_report, sales_report)
+    for sales_report in sample:
+        benchmark.time(
+            "generate_report.cached", sales_reports.generate_report, sales_report
+        )
+    SalesReports.spooler.close()
+    Database.close_all()
+    Metrics.disable()
+
+    return {
+        "parameters": {**vars(args), "sales_reports": len(reports)},
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "operations": benchmark.summary(),
+        **({"metrics": Metrics.snapshot()} if args.metrics else {}),
+    }
+
+
+def main(args: list[str]) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    parser.add_argument("--stores", type=int, default=3)
+    parser.add_argument("--employees", type=int, default=12)
+    parser.add_argument("--years", type=int, default=1)
+    parser.add_argument("--engine", choices=ENGINES, default="json")
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--renders", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument(
+        "--metrics", action="store_true", help="also record the data layer metrics"
+    )
+    options = parser.parse_args(args)
+    options.output = os.path.abspath(options.output)
+
+    # The report template reads its assets relative to the project root
+    os.chdir(ROOT)
+    with tempfile.TemporaryDirectory() as directory:
+        results = run(options, directory)
+
+    for operation, stats in results["operations"].items():
+        print(
+            f"{operation:<24} {stats['runs']:>5} runs  "
+            f"median {stats['median_ms']:>9.3f} ms  p95 {stats['p95_ms']:>9.3f} ms"
+        )
+    with open(options.output, "w") as file:
+        json.dump(results, file, indent=4)
+    print(f"Results written to {options.output}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
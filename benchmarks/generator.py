@@ -0,0 +1,147 @@
+import random
+from datetime import date as dt
+from datetime import timedelta
+from typing import Iterator
+
+from models.sales_report import BILLS, CENTS
+
+FIRST_NAMES = [
+    "Ana", "Bruno", "Carla", "Diego", "Elena", "Franco", "Gina", "Hugo",
+    "Irene", "Julian", "Karen", "Lucas", "Marta", "Nico", "Olga", "Pablo",
+]  # fmt: skip
+LAST_NAMES = [
+    "Alvarez", "Benitez", "Castro", "Dominguez", "Espinoza", "Fernandez",
+    "Gomez", "Herrera", "Ibarra", "Juarez", "Lopez", "Molina", "Navarro",
+]  # fmt: skip
+CITIES = [
+    "Miami", "Orlando", "Tampa", "Naples", "Sarasota", "Ocala", "Destin",
+    "Tallahassee", "Jacksonville", "Gainesville", "Pensacola", "Sebring",
+]  # fmt: skip
+
+
+class SyntheticData:
+    """Deterministic employees, stores and daily sales reports.
+
+    The same ``seed`` always yields the same rows, in the format the
+    repositories store, for ``years`` of daily reports per store ending on
+    ``end``.
+    """
+
+    def __init__(
+        self,
+        stores: int = 3,
+        employees: int = 12,
+        years: int = 1,
+        end: dt = dt(2024, 12, 31),
+        seed: int = 0,
+    ):
+        self.stores = stores
+        self.employees = employees
+        self.years = years
+        self.end = end
+        self.seed = seed
+
+    @property
+    def start(self) -> dt:
+        return self.end - timedelta(days=365 * self.years - 1)
+
+    def employee_rows(self) -> list[dict]:
+        rows = []
+        for id in range(1, self.employees + 1):
+            first = FIRST_NAMES[(id - 1) % len(FIRST_NAMES)]
+            last = LAST_NAMES[(id - 1) // len(FIRST_NAMES) % len(LAST_NAMES)]
+            rows.append(
+                {
+                    "id": id,
+                    "name": f"{first} {last} {id}",
+                    "initials": f"{first[0]}{last[0]}{id}",
+                    "color": f"#{id * 2654435761 % 0xFFFFFF:06x}",
+                }
+            )
+        return rows
+
+    def store_rows(self) -> list[dict]:
+        rows = []
+        for id in range(1, self.stores + 1):
+            city = CITIES[(id - 1) % len(CITIES)]
+            rows.append({"id": id, "name": f"{city} {id}", "initials": f"S{id}"})
+        return rows
+
+    def staff(self, store: int) -> list[int]:
+        """Retrieve the employees working at a store, at least two of them."""
+        staff = list(range(store, self.employees + 1, self.stores))
+        return staff if len(staff) >= 2 else list(range(1, min(self.employees, 2) + 1))
+
+    def sales_report_rows(self) -> Iterator[dict]:
+        """Yield a closed report per store and day, in ID order."""
+        rng = random.Random(self.seed)
+        id = 0
+        for day in range(365 * self.years):
+            date = self.start + timedelta(days=day)
+            for store in range(1, self.stores + 1):
+                id += 1
+                yield self.sales_report(rng, id, store, date)
+
+    def sales_report(self, rng: random.Random, id: int, store: int, date: dt) -> dict:
+        opening = rng.choice((9, 10))
+        closing = rng.choice((18, 19, 20)) - (date.weekday() == 6) * 2
+        staff = self.staff(store)
+        staff = rng.sample(staff, min(len(staff), 3))
+        arrivals, departures = [], []
+        for shift, employee in enumerate(staff):
+            arrival = opening + shift * 2
+            departure = min(closing, arrival + rng.choice((6, 7, 8)))
+            arrivals.append({"employee": employee, "time": f"{arrival:02}:00"})
+            departures.append({"employee": employee, "time": f"{departure:02}:00"})
+        departures[-1]["time"] = f"{closing:02}:00"
+
+        # A drawer starts with a few hundred dollars and closes with the cash sales
+        money_open = self.money(rng, rng.randint(200, 400))
+        sales = self.movements(rng, 40)
+        returns = self.movements(rng, 3)
+        cash = round(sales["cash"]["amount"] - returns["cash"]["amount"])
+        money_close = self.money(rng, rng.randint(200, 400) + max(cash, 0))
+        counts_open = self.counts(rng)
+        counts_close = {
+            "littmanns": max(counts_open["littmanns"] - rng.randint(0, 2), 0),
+            "gift_cards": counts_open["gift_cards"],
+        }
+        return {
+            "id": id,
+            "date": date.strftime("%Y-%m-%d"),
+            "store": store,
+            "schedule": {"arrivals": arrivals, "departures": departures},
+            "money_open": money_open,
+            "counts_open": counts_open,
+            "money_close": money_close,
+            "counts_close": counts_close,
+            "returns": returns,
+            "sales": sales,
+        }
+
+    @staticmethod
+    def money(rng: random.Random, dollars: int) -> dict:
+        """Break an amount into bills, largest first, and a handful of coins."""
+        bills = {}
+        for bill in BILLS:
+            count, dollars = divmod(dollars, int(bill))
+            if count or rng.random() < 0.3:
+                bills[bill] = count
+        cents = {cent: rng.randint(0, 10) for cent in CENTS}
+        return {"bills": bills, "cents": cents}
+
+    @staticmethod
+    def movements(rng: random.Random, transactions: int) -> dict:
+        movements = {}
+        for type, share in (("cash", 0.3), ("card", 0.6), ("gift", 0.1)):
+            qty = rng.randint(0, round(transactions * share))
+            amount = sum(rng.randint(1500, 9000) for _ in range(qty)) / 100
+            movements[type] = {"qty": qty, "amount": amount}
+        return movements
+
+    @staticmethod
+    def counts(rng: random.Random) -> dict:
+        return {
+            "littmanns": rng.randint(5, 30),
+            "gift_cards": {"fifty": rng.randint(0, 10), "t_five": rng.randint(0, 10)},
+        }
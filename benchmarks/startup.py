@@ -0,0 +1,64 @@
+"""Measure how long a fresh interpreter takes to import each package.
+
+Usage: python benchmarks/startup.py [runs] [output.json]
+"""
+
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+MODULES = ["models", "helpers", "databases", "databases.sales_reports"]
+
+SNIPPET = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(elapsed, "reportlab" in sys.modules)
+"""
+
+
+def measure(module: str, runs: int) -> dict:
+    """Import ``module`` in ``runs`` fresh interpreters and time it."""
+    timings = []
+    reportlab = False
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", SNIPPET.format(module=module)],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.split()
+        timings.append(float(output[0]) * 1000)
+        reportlab = output[1] == "True"
+    return {
+        "module": module,
+        "runs": runs,
+        "median_ms": round(statistics.median(timings), 2),
+        "min_ms": round(min(timings), 2),
+        "loads_reportlab": reportlab,
+    }
+
+
+def main(args: list[str]) -> int:
+    runs = int(args[0]) if args else 10
+    results = [measure(module, runs) for module in MODULES]
+    for result in results:
+        print(
+            f"{result['module']:<26} {result['median_ms']:>8.2f} ms"
+            f"  (min {result['min_ms']:.2f})"
+            f"{'  loads ReportLab' if result['loads_reportlab'] else ''}"
+        )
+    if len(args) > 1:
+        with open(args[1], "w") as file:
+            json.dump(results, file, indent=4)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
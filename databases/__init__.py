@@ -1,3 +1,6 @@
 from .employees import Employees
+from .metrics import Metrics
+from .rollups import SalesRollups
 from .sales_reports import SalesReports
 from .stores import Stores
+from .tables import ConflictError, DuplicateError
@@ -0,0 +1,97 @@
+import signal
+import sys
+from datetime import date
+
+from .bulk import BulkReports
+from .database import Database
+from .labor import LaborHours
+from .migrate import migrate, verify
+from .reconciliation import CashReconciliation
+from .rollups import SalesRollups
+from .server import DatabaseServer
+
+USAGE = """Usage:
+    python -m databases migrate <database.json> <database.sqlite>
+    python -m databases rebuild-rollups
+    python -m databases audit [tolerance]
+    python -m databases labor [date_from date_to]
+    python -m databases shard
+    python -m databases import <file.csv|file.jsonl>
+    python -m databases export <file.csv|file.jsonl> [date_from date_to]
+    python -m databases serve <socket path|host:port> [flush_interval]"""
+
+
+def main(args: list[str]) -> int:
+    command = args[0] if args else None
+
+    if command == "migrate" and len(args) == 3:
+        source, target = args[1:]
+        for name, count in migrate(source, target).items():
+            print(f"{name}: {count} rows migrated.")
+        mismatches = verify(source, target)
+
+    elif command == "rebuild-rollups":
+        mismatches = SalesRollups().rebuild()
+        print("Rollups rebuilt.")
+
+    elif command == "audit" and len(args) <= 2:
+        tolerance = float(args[1]) if len(args) == 2 else 0.0
+        mismatches = CashReconciliation(tolerance).audit()
+        print(f"{len(mismatches)} discrepancies found.")
+
+    elif command == "labor" and len(args) in (1, 3):
+        dates = [date.fromisoformat(arg) for arg in args[1:]] or [None, None]
+        summary = LaborHours().analyze(None, *dates)
+        for store, hours in summary.store_hours.items():
+            print(
+                f"Store {store}: {hours} labor hours, "
+                f"{summary.overlap.get(store, 0)} overlapping, "
+                f"${summary.sales_per_labor_hour.get(store, 0)} sales per hour."
+            )
+        for employee, hours in summary.employee_hours.items():
+            print(f"Employee {employee}: {hours} hours.")
+        for hour, headcount in summary.headcount.items():
+            print(f"{hour:02}:00 {headcount} employees on average.")
+        # Gaps in the schedules are findings, not a failure
+        for gap in summary.gaps:
+            print(f"Gap in coverage: {gap}.")
+        mismatches = []
+
+    elif command == "shard" and len(args) == 1:
+        count = Database.open(sharded=True).shard("sales_reports")
+        print(f"{count} sales reports moved to shards.")
+        mismatches = []
+
+    elif command == "import" and len(args) == 2:
+        results = BulkReports().import_file(args[1])
+        mismatches = [result for result in results if result.error]
+        print(f"{len(results) - len(mismatches)} sales reports imported.")
+
+    elif command == "export" and len(args) in (2, 4):
+        dates = [date.fromisoformat(arg) for arg in args[2:]] or [None, None]
+        count = BulkReports().export(args[1], None, *dates)
+        print(f"{count} sales reports exported.")
+        mismatches = []
+
+    elif command == "serve" and len(args) in (2, 3):
+        server = DatabaseServer(args[1], *map(float, args[2:]))
+        # Stop on SIGTERM as on Ctrl+C, so pending changes are written
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        print(f"Serving the database on {args[1]}.", flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        mismatches = []
+
+    else:
+        print(USAGE)
+        return 2
+
+    for mismatch in mismatches:
+        print(mismatch)
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
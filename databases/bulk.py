@@ -0,0 +1,341 @@
+import csv
+import gc
+import json
+from contextlib import contextmanager
+from datetime import date as dt
+from functools import lru_cache
+from itertools import islice
+from typing import IO, Any, Iterable, Iterator
+
+from models import Store
+from models.sales_report import BILLS, CENTS, parse_time
+
+from .database import Database
+from .metrics import timed
+from .rollups import MOVEMENT_TYPES, SalesRollups
+
+CLOSE_FIELDS = ("money_close", "counts_close", "returns", "sales")
+
+# Flat CSV layout of a sales report, nested fields joined with dots. The ID
+# and version are exported for reference, imports assign their own.
+COLUMNS = [
+    "id",
+    "version",
+    "date",
+    "store",
+    "schedule.arrivals",
+    "schedule.departures",
+    *(
+        f"{money}.{kind}.{denomination}"
+        for money in ("money_open", "money_close")
+        for kind, denominations in (("bills", BILLS), ("cents", CENTS))
+        for denomination in denominations
+    ),
+    *(
+        f"{counts}.{field}"
+        for counts in ("counts_open", "counts_close")
+        for field in ("littmanns", "gift_cards.fifty", "gift_cards.t_five")
+    ),
+    *(
+        f"{kind}.{type}.{field}"
+        for kind in ("sales", "returns")
+        for type in MOVEMENT_TYPES
+        for field in ("qty", "amount")
+    ),
+]
+
+
+@lru_cache(maxsize=2048)
+def shift_time(value: str) -> str:
+    """Rewrite a shift time as ``HH:MM``."""
+    time = parse_time(value)
+    return f"{time.hour:02}:{time.minute:02}"
+
+
+@contextmanager
+def collector_paused() -> Iterator[None]:
+    """Pause the cyclic garbage collector, if it is running."""
+    # Report documents hold no cycles, but building thousands of them makes
+    # the collector scan all the ones built so far again and again
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+class ImportResult:
+    __slots__ = ("row", "sales_report", "error")
+
+    def __init__(self, row: int, sales_report: int | None, error: str | None = None):
+        self.row = row
+        self.sales_report = sales_report
+        self.error = error
+
+    def __repr__(self) -> str:
+        return f"{self.row}: {self.error or self.sales_report}"
+
+
+class BulkReports:
+    """Imports and exports sales reports in CSV or JSON Lines files.
+
+    Imports are validated and written ``batch_size`` rows at a time: the
+    stores and employees are resolved once for the whole file, by ID or by
+    initials, each batch takes a block of IDs and is committed with a single
+    write, and its closed reports update the rollups together. Exports
+    stream the table rows straight to the file. The date of a report comes
+    from the file, so history can be backfilled.
+    """
+
+    def __init__(self, batch_size: int = 50000):
+        self.batch_size = batch_size
+        self.__table = Database().table("sales_reports")
+
+    @staticmethod
+    def __references(name: str) -> dict[Any, int]:
+        """Map the IDs and initials of a table's rows to their IDs."""
+        references: dict[Any, int] = {}
+        for row in Database().table(name).all():
+            references[row["initials"]] = row["id"]
+            references[str(row["id"])] = row["id"]
+            references[row["id"]] = row["id"]
+        return references
+
+    @staticmethod
+    def read_csv(file: IO[str]) -> Iterator[dict]:
+        """Parse the rows of a CSV file laid out as ``COLUMNS``."""
+        for record in csv.DictReader(file):
+            row: dict[str, Any] = {}
+            for column, value in record.items():
+                if value is None or value == "":
+                    continue
+                *path, field = column.split(".")
+                target = row
+                for key in path:
+                    target = target.setdefault(key, {})
+                target[field] = value
+            for kind in ("arrivals", "departures"):
+                shifts = row.get("schedule", {}).get(kind, "")
+                row.setdefault("schedule", {})[kind] = [
+                    {"employee": employee, "time": time}
+                    for employee, _, time in (
+                        shift.partition("@") for shift in shifts.split()
+                    )
+                ]
+            yield row
+
+    @staticmethod
+    def read_jsonl(file: IO[str]) -> Iterator[dict]:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+    @staticmethod
+    def __count(value: Any) -> int:
+        if type(value) is int and value >= 0:
+            return value
+        if type(value) is not int:
+            # Counts read from CSV are strings
+            count = int(value)
+            if count != float(value):
+                raise ValueError(f"invalid count {value}")
+            value = count
+        if value < 0:
+            raise ValueError(f"invalid count {value}")
+        return value
+
+    @classmethod
+    def __denominations(cls, counts: dict, denominations: tuple) -> dict[str, int]:
+        valid = {}
+        for denomination, count in counts.items():
+            if denomination not in denominations:
+                raise ValueError(f"unknown denomination {denomination}")
+            valid[denomination] = cls.__count(count)
+        return valid
+
+    def validate(
+        self, row: dict, stores: dict[Any, int], employees: dict[Any, int]
+    ) -> dict:
+        """Build the document of a row, raising ``ValueError`` if invalid."""
+        try:
+            date = dt.fromisoformat(str(row["date"])).isoformat()
+            if row["store"] not in stores:
+                raise ValueError(f"unknown store {row['store']}")
+            doc: dict[str, Any] = {"date": date, "store": stores[row["store"]]}
+
+            schedule = {}
+            for kind in ("arrivals", "departures"):
+                shifts = schedule[kind] = []
+                for shift in row["schedule"][kind]:
+                    employee = employees.get(shift["employee"])
+                    if employee is None:
+                        raise ValueError(f"unknown employee {shift['employee']}")
+                    shifts.append(
+                        {"employee": employee, "time": shift_time(shift["time"])}
+                    )
+            doc["schedule"] = schedule
+
+            closed = [field for field in CLOSE_FIELDS if row.get(field)]
+            if closed and len(closed) != len(CLOSE_FIELDS):
+                missing = set(CLOSE_FIELDS) - set(closed)
+                raise ValueError(f"missing {', '.join(sorted(missing))}")
+            for kind in ("open", "close") if closed else ("open",):
+                money = row[f"money_{kind}"]
+                doc[f"money_{kind}"] = {
+                    "bills": self.__denominations(money.get("bills", {}), BILLS),
+                    "cents": self.__denominations(money.get("cents", {}), CENTS),
+                }
+                counts = row[f"counts_{kind}"]
+                doc[f"counts_{kind}"] = {
+                    "littmanns": self.__count(counts["littmanns"]),
+                    "gift_cards": {
+                        card: self.__count(counts["gift_cards"][card])
+                        for card in ("fifty", "t_five")
+                    },
+                }
+            for kind in ("returns", "sales") if closed else ():
+                doc[kind] = {
+                    type: {
+                        "qty": self.__count(row[kind][type]["qty"]),
+                        "amount": round(float(row[kind][type]["amount"]), 2),
+                    }
+                    for type in MOVEMENT_TYPES
+                }
+        except KeyError as error:
+            raise ValueError(f"missing {error.args[0]}") from None
+        except (TypeError, AttributeError):
+            raise ValueError("malformed row") from None
+        return doc
+
+    def __existing(self, docs: list[dict]) -> set[tuple[int, str]]:
+        """Retrieve the store and date of the stored reports in the docs' range.
+
+        A single range scan finds them all, rather than a lookup per doc.
+        """
+        if not docs:
+            return set()
+        stores = {doc["store"] for doc in docs}
+        dates = [doc["date"] for doc in docs]
+        rows = self.__table.ordered(
+            "date",
+            low=min(dates),
+            high=max(dates),
+            **({"store": stores.pop()} if len(stores) == 1 else {}),
+        )
+        return {(row["store"], row["date"]) for row in rows}
+
+    def __import_batch(
+        self,
+        batch: list[dict],
+        results: list[ImportResult],
+        stores: dict[Any, int],
+        employees: dict[Any, int],
+        seen: set[tuple[int, str]],
+    ):
+        valid = []
+        for row in batch:
+            result = ImportResult(len(results) + 1, None)
+            results.append(result)
+            try:
+                valid.append((result, self.validate(row, stores, employees)))
+            except ValueError as error:
+                result.error = f"{str(error).capitalize()}."
+
+        # Check for duplicates in the batch, so no other writer adds the same
+        # reports between the check and the insert
+        with Database().batch():
+            existing = self.__existing([doc for _, doc in valid])
+            docs = []
+            imported = []
+            for result, doc in valid:
+                key = (doc["store"], doc["date"])
+                if key in seen or key in existing:
+                    result.error = f"Store {key[0]} already has a report for {key[1]}."
+                    continue
+                seen.add(key)
+                docs.append(doc)
+                imported.append(result)
+
+            if not docs:
+                return
+            ids = Database.get_next_ids(self.__table, len(docs))
+            docs = [{"id": id, **doc} for id, doc in zip(ids, docs)]
+            self.__table.insert_multiple(docs)
+            SalesRollups().add_many(doc for doc in docs if "sales" in doc)
+        for result, id in zip(imported, ids):
+            result.sales_report = id
+
+    @timed("bulk.import")
+    def import_rows(self, rows: Iterable[dict]) -> list[ImportResult]:
+        """Import report rows, returning a result for each, in order."""
+        stores = self.__references("stores")
+        employees = self.__references("employees")
+        results: list[ImportResult] = []
+        seen: set[tuple[int, str]] = set()
+        rows = iter(rows)
+
+        with collector_paused():
+            while batch := list(islice(rows, self.batch_size)):
+                self.__import_batch(batch, results, stores, employees, seen)
+        return results
+
+    def import_file(self, file_name: str) -> list[ImportResult]:
+        """Import a ``.csv`` or ``.jsonl`` file of sales reports."""
+        with open(file_name, newline="") as file:
+            if file_name.endswith(".csv"):
+                return self.import_rows(self.read_csv(file))
+            return self.import_rows(self.read_jsonl(file))
+
+    @staticmethod
+    def flatten(row: dict) -> dict[str, Any]:
+        """Lay out a report row as ``COLUMNS``."""
+        record: dict[str, Any] = {}
+        for key, value in row.items():
+            if key == "schedule":
+                for kind in ("arrivals", "departures"):
+                    record[f"schedule.{kind}"] = " ".join(
+                        f"{shift['employee']}@{shift['time']}" for shift in value[kind]
+                    )
+            elif isinstance(value, dict):
+                for field, inner in BulkReports.flatten(value).items():
+                    record[f"{key}.{field}"] = inner
+            else:
+                record[key] = value
+        return record
+
+    @timed("bulk.export")
+    def export(
+        self,
+        file_name: str,
+        store: Store | None = None,
+        date_from: dt | None = None,
+        date_to: dt | None = None,
+    ) -> int:
+        """Write the matching reports to a ``.csv`` or ``.jsonl`` file.
+
+        Reports are written in date order, and their count is returned. CSV
+        files hold the columns of ``COLUMNS`` only, so counts of other
+        denominations kept by a report are left out; JSON Lines files hold
+        every field.
+        """
+        rows = self.__table.ordered(
+            "date",
+            low=date_from.strftime("%Y-%m-%d") if date_from else None,
+            high=date_to.strftime("%Y-%m-%d") if date_to else None,
+            **({"store": store.id} if store else {}),
+        )
+        count = 0
+        with open(file_name, "w", newline="") as file:
+            if file_name.endswith(".csv"):
+                writer = csv.DictWriter(file, COLUMNS, extrasaction="ignore")
+                writer.writeheader()
+                for row in rows:
+                    writer.writerow(self.flatten(row))
+                    count += 1
+            else:
+                for row in rows:
+                    file.write(json.dumps(row) + "\n")
+                    count += 1
+        return count
@@ -0,0 +1,56 @@
+from typing import Callable, Generic, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class ListingCache(Generic[T]):
+    """Model objects of a table, kept while the table version is unchanged.
+
+    Any write to the table, here or by another process, changes its version
+    and so drops everything cached for the previous one.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.__version: Hashable = None
+        self.__listing: list[T] | None = None
+        self.__items: dict[int, T | None] = {}
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+    def __check(self, version: Hashable):
+        if version != self.__version:
+            self.invalidate()
+            self.__version = version
+
+    def invalidate(self):
+        self.__listing = None
+        self.__items.clear()
+
+    def listing(
+        self, version: Hashable, build: Callable[[], list[T]], id: Callable[[T], int]
+    ) -> list[T]:
+        """Retrieve the full listing, building it on a miss."""
+        self.__check(version)
+        if self.__listing is None:
+            self.misses += 1
+            self.__listing = build()
+            self.__items.update((id(item), item) for item in self.__listing)
+        else:
+            self.hits += 1
+        return list(self.__listing)
+
+    def get(
+        self, version: Hashable, id: int, build: Callable[[], T | None]
+    ) -> T | None:
+        """Retrieve a single item, building it on a miss."""
+        self.__check(version)
+        if id in self.__items:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self.__items[id] = build()
+        return self.__items[id]
@@ -1,24 +1,282 @@
-from tinydb import Query, TinyDB
-from tinydb.table import Table
+import os
+from contextlib import contextmanager
+from typing import Iterator
+
+from tinydb import TinyDB
+
+from helpers import generate_initials
+
+from .cache import ListingCache
+from .metrics import timed
+from .remote import RemoteDatabase, RemoteTable
+from .shards import ShardedTable
+from .sqlite import SQLiteDatabase, SQLiteTable
+from .storages import CachedJSONStorage, JournalStorage
+from .tables import (
+    ALWAYS_SHARDED,
+    INDEXES,
+    ORDERED_INDEXES,
+    SHARDS,
+    IndexedTable,
+    Sequences,
+)
+
+DatabaseTable = IndexedTable | RemoteTable | ShardedTable | SQLiteTable
 
 
 class Database:
-    def __init__(self):
-        self.db = TinyDB("database.json")
+    """Process-wide database handle shared by every repository.
+
+    ``Database()`` returns the open handle for the configured path, opening it
+    on first use, so repositories never parse the file more than once.
+    ``backend`` selects between TinyDB (``"tinydb"``) and SQLite (``"sqlite"``),
+    and ``storage_class`` the TinyDB storage engine used for new handles,
+    ``CachedJSONStorage`` or ``JournalStorage``.
+    With ``sharded``, TinyDB keeps the sales reports in a file per store and
+    month under ``<path>.shards`` instead of the main file; the sales rollups
+    are always kept there, moved out of the main file when first opened from
+    an older one. The ``"remote"``
+    backend uses the database of a ``DatabaseServer``, whose socket path or
+    ``host:port`` address takes the place of the path.
+    """
+
+    path = "database.json"
+    backend = "tinydb"
+    storage_class: type[CachedJSONStorage | JournalStorage] = CachedJSONStorage
+    sharded = False
+    __handles: dict[str, "Database"] = {}
+
+    def __new__(cls, path: str | None = None) -> "Database":
+        path = path or cls.path
+        if cls.backend != "remote":
+            path = os.path.abspath(path)
+        if path not in cls.__handles:
+            handle = super().__new__(cls)
+            handle.__connect(path)
+            cls.__handles[path] = handle
+        return cls.__handles[path]
+
+    def __connect(self, path: str):
+        self.path = path
+        self.__tables: dict[str, IndexedTable | ShardedTable] = {}
+        self.__caches: dict[str, ListingCache] = {}
+        if self.backend == "sqlite":
+            self.db = SQLiteDatabase(path)
+            return
+        if self.backend == "remote":
+            self.db = RemoteDatabase(path)
+            return
+
+        self.db = TinyDB(path, storage=self.storage_class, on_reload=self.__reloaded)
+        self.__sequences = Sequences(self.db.table("_meta"))
+
+    def __reloaded(self):
+        # The file changed outside this handle, drop what the tables remember
+        for name in self.db.tables():
+            table = self.db.table(name)
+            table.clear_cache()
+            table._next_id = None
+
+    @classmethod
+    def open(
+        cls,
+        path: str | None = None,
+        storage: type[CachedJSONStorage | JournalStorage] | None = None,
+        backend: str | None = None,
+        sharded: bool | None = None,
+    ) -> "Database":
+        """Set the default database path and engine, and return the handle."""
+        if path:
+            cls.path = path
+        if storage:
+            # Handles rely on the file lock, reload callback and generation
+            # of these storages
+            if not issubclass(storage, (CachedJSONStorage, JournalStorage)):
+                raise ValueError(
+                    f"unsupported storage {storage.__name__}, use "
+                    "CachedJSONStorage or JournalStorage"
+                )
+            cls.storage_class = storage
+        if backend:
+            cls.backend = backend
+        if sharded is not None:
+            cls.sharded = sharded
+        return cls()
+
+    @classmethod
+    def close_all(cls):
+        """Flush and close every open handle."""
+        for handle in list(cls.__handles.values()):
+            handle.close()
+
+    def table(self, name: str) -> DatabaseTable:
+        """Retrieve the indexed table with the given name."""
+        if isinstance(self.db, (SQLiteDatabase, RemoteDatabase)):
+            return self.db.table(name)
+
+        if name not in self.__tables and name in ALWAYS_SHARDED:
+            if name in self.db.tables():
+                # Kept in the main file by an earlier version
+                self.shard(name)
+            else:
+                self.__tables[name] = self.__sharded_table(name)
+        elif name not in self.__tables and self.sharded and name in SHARDS:
+            self.__tables[name] = self.__sharded_table(name)
+        elif name not in self.__tables:
+            self.__tables[name] = IndexedTable(
+                self.db.table(name),
+                INDEXES.get(name, [("id",)]),
+                self.__sequences,
+                ORDERED_INDEXES.get(name),
+            )
+        return self.__tables[name]
+
+    def __sharded_table(self, name: str) -> ShardedTable:
+        directory = os.path.join(f"{self.path}.shards", name)
+        unique = [fields for fields in INDEXES.get(name, []) if fields != ("id",)]
+        return ShardedTable(directory, name, SHARDS[name], self.storage.lock, unique)
+
+    def cache(self, name: str) -> ListingCache:
+        """Retrieve the model cache of the table with the given name."""
+        if name not in self.__caches:
+            self.__caches[name] = ListingCache()
+        return self.__caches[name]
+
+    @property
+    def storage(self) -> CachedJSONStorage | JournalStorage:
+        return self.db.storage  # type: ignore
+
+    @property
+    def __shards(self) -> list[ShardedTable]:
+        return [t for t in self.__tables.values() if isinstance(t, ShardedTable)]
+
+    @timed("database.flush")
+    def flush(self):
+        """Write pending changes to disk."""
+        if isinstance(self.db, TinyDB):
+            for table in self.__shards:
+                table.flush()
+            self.storage.flush()
+        elif isinstance(self.db, RemoteDatabase):
+            self.db.flush()
+
+    def close(self):
+        """Flush pending changes and release the file."""
+        if isinstance(self.db, TinyDB):
+            for table in self.__shards:
+                table.flush()
+        self.db.close()
+        self.__handles.pop(self.path, None)
+
+    @contextmanager
+    def batch(self) -> Iterator["Database"]:
+        """Group several writes into a single write to disk.
+
+        Other processes can neither read nor write the file until it ends.
+        """
+        if isinstance(self.db, SQLiteDatabase):
+            with self.db.transaction():
+                yield self
+            return
+        if isinstance(self.db, RemoteDatabase):
+            with self.db.batch():
+                yield self
+            return
+
+        with self.storage.lock.exclusive():
+            if not self.storage.write_through:
+                yield self
+                return
+
+            self.storage.write_through = False
+            for table in self.__shards:
+                table.write_through = False
+            try:
+                yield self
+            finally:
+                self.storage.write_through = True
+                for table in self.__shards:
+                    table.write_through = True
+                self.flush()
+
+    def shard(self, name: str) -> int:
+        """Move the rows of a table out of the main file into its shards.
+
+        Returns the number of rows moved.
+        """
+        rows = sorted(self.db.table(name).all(), key=lambda row: row["id"])
+        table = self.__tables[name] = self.__sharded_table(name)
+        with self.batch():
+            table.insert_multiple(rows)
+            # Keep the IDs of removed rows from being allocated again
+            if (next := self.__sequences.next(name)) is not None:
+                table.allocate_ids(max(next - table.allocate_ids(0).start, 0))
+            self.db.drop_table(name)
+        return len(rows)
 
     @staticmethod
-    def get_next_id(table: Table) -> int:
+    def get_next_id(table: DatabaseTable) -> int:
         """Retrieve the next available ID."""
-        if not table.all():
-            return 1
-        max_id = max(employee["id"] for employee in table.all())
-        return max_id + 1
+        return table.allocate_ids().start
 
     @staticmethod
-    def check_existence(table: Table, **kwargs) -> str | None:
+    def get_next_ids(table: DatabaseTable, count: int) -> range:
+        """Retrieve a block of available IDs for a bulk insert."""
+        return table.allocate_ids(count)
+
+    @staticmethod
+    @timed("database.check_existence")
+    def check_existence(table: DatabaseTable, **kwargs) -> str | None:
         """Check the existence of a value in a table."""
         for key, value in kwargs.items():
-            if table.search(Query()[key] == value):
+            if value is not None and table.lookup(**{key: value}):
                 return (
                     f"{table.name[:-1].capitalize()} with {key} {value} already exists."
                 )
+
+    @staticmethod
+    @timed("database.check_existence_many")
+    def check_existence_many(
+        table: DatabaseTable, rows: list[dict], fields: tuple[str, ...]
+    ) -> list[str | None]:
+        """Check a batch of rows against the table and each other in one pass.
+
+        Rows with an ``id`` may keep their own values, and must still be at
+        their ``version`` if they have one. Rows without initials get them
+        generated from their name, numbered if already taken. Returns the
+        duplicate or conflict message of each row, or None if it can be written.
+        """
+        owners: dict[str, dict] = {field: {} for field in fields}
+        versions: dict[int, int] = {}
+        for row in table.all():
+            versions[row["id"]] = row.get("version", 0)
+            for field in fields:
+                owners[field][row.get(field)] = row["id"]
+
+        messages: list[str | None] = []
+        for index, row in enumerate(rows):
+            # New rows of the batch own their values until they get an ID
+            owner = row.get("id", (index,))
+            if "initials" in fields and not row.get("initials"):
+                base = candidate = generate_initials(row["name"])
+                number = 2
+                while owners["initials"].get(candidate, owner) != owner:
+                    candidate = f"{base[:4 - len(str(number))]}{number}"
+                    number += 1
+                row["initials"] = candidate
+
+            label = table.name[:-1].capitalize()
+            message = None
+            if "version" in row and versions.get(owner) != row["version"]:
+                message = f"{label} {owner} changed since it was read."
+            for field in fields:
+                value = row.get(field)
+                if message is None and value is not None:
+                    if owners[field].get(value, owner) != owner:
+                        message = f"{label} with {field} {value} already exists."
+
+            messages.append(message)
+            if message is None:
+                for field in fields:
+                    owners[field][row.get(field)] = owner
+        return messages
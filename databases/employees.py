@@ -1,42 +1,91 @@
-from tinydb import Query
+from typing import Iterable, List, Mapping
 
 from models import Employee
 
+from .cache import ListingCache
 from .database import Database
+from .metrics import timed
+from .tables import ConflictError
 
 
 class Employees:
     def __init__(self):
-        self.__table = Database().db.table("employees")
+        self.__table = Database().table("employees")
+        self.__cache: ListingCache[Employee] = Database().cache("employees")
 
-    @property
-    def list(self) -> list[Employee]:
+    @timed("employees.hydrate")
+    def __load(self) -> list[Employee]:
         return sorted(
             [Employee.from_dict(emp) for emp in self.__table.all()],
             key=lambda emp: emp.name,
         )
 
+    @property
+    @timed("employees.list")
+    def list(self) -> list[Employee]:
+        return self.__cache.listing(
+            self.__table.version, self.__load, lambda emp: emp.id
+        )
+
+    @property
+    def cache_stats(self) -> dict[str, int]:
+        return self.__cache.stats
+
+    @timed("employees.get")
     def get(self, id: int) -> Employee | None:
-        employee = self.__table.get(Query().id == id)
+        return self.__cache.get(self.__table.version, id, lambda: self.__get(id))
+
+    def __get(self, id: int) -> Employee | None:
+        employee = self.__table.get(id)
         if not employee:
             return None
         return Employee.from_dict(employee)  # type: ignore
 
+    @timed("employees.add")
     def add(self, name: str, initials: str, color: str) -> str:
-        id = Database.get_next_id(self.__table)
+        with Database().batch():
+            # Check if an employee already exists
+            if existing_employee := Database.check_existence(
+                self.__table, name=name, initials=initials, color=color
+            ):
+                return existing_employee
 
-        # Check if an employee already exists
-        if existing_employee := Database.check_existence(
-            self.__table, name=name, initials=initials, color=color
-        ):
-            return existing_employee
-
-        # Add new employee if no duplicates found
-        self.__table.insert(
-            {"id": id, "name": name, "initials": initials, "color": color}
-        )
+            # Add new employee if no duplicates found
+            id = Database.get_next_id(self.__table)
+            self.__table.insert(
+                {"id": id, "name": name, "initials": initials, "color": color}
+            )
         return f"Employee {name} added with ID {id}."
 
+    @timed("employees.add_many")
+    def add_many(self, employees: Iterable[Mapping]) -> List[str]:
+        """Add several employees with a single write, returning a message for each.
+
+        Employees without initials get them generated from their name.
+        """
+        rows = [
+            {
+                "name": employee["name"],
+                "initials": employee.get("initials"),
+                "color": employee["color"],
+            }
+            for employee in employees
+        ]
+        with Database().batch():
+            messages = Database.check_existence_many(
+                self.__table, rows, ("name", "initials", "color")
+            )
+            new = [row for row, message in zip(rows, messages) if message is None]
+            ids = Database.get_next_ids(self.__table, len(new))
+            for id, row in zip(ids, new):
+                row["id"] = id
+            self.__table.insert_multiple(new)
+        return [
+            message or f"Employee {row['name']} added with ID {row['id']}."
+            for row, message in zip(rows, messages)
+        ]
+
+    @timed("employees.edit")
     def edit(
         self,
         employee: Employee,
@@ -44,23 +93,58 @@ class Employees:
         initials: str | None = None,
         color: str | None = None,
     ) -> str:
-        if existing_store := Database.check_existence(
-            self.__table, name=name, initials=initials, color=color
-        ):
-            return existing_store
+        with Database().batch():
+            if existing_store := Database.check_existence(
+                self.__table, name=name, initials=initials, color=color
+            ):
+                return existing_store
 
-        self.__table.update(
-            {
-                "name": name or employee.name,
-                "initials": initials or employee.initials,
-                "color": color or employee.color,
-            },
-            Query().id == employee.id,
-        )
+            try:
+                self.__table.update(
+                    employee.id,
+                    {
+                        "name": name or employee.name,
+                        "initials": initials or employee.initials,
+                        "color": color or employee.color,
+                    },
+                    employee.version,
+                )
+            except ConflictError as error:
+                return str(error)
         return f"Employee {name or employee.name} updated."
 
+    @timed("employees.edit_many")
+    def edit_many(self, edits: Iterable[tuple[Employee, Mapping]]) -> List[str]:
+        """Edit several employees with a single write, returning a message for each."""
+        rows = [
+            {
+                "id": employee.id,
+                "name": fields.get("name") or employee.name,
+                "initials": fields.get("initials") or employee.initials,
+                "color": fields.get("color") or employee.color,
+                "version": employee.version,
+            }
+            for employee, fields in edits
+        ]
+        with Database().batch():
+            messages = Database.check_existence_many(
+                self.__table, rows, ("name", "initials", "color")
+            )
+            self.__table.update_many(
+                {
+                    row.pop("id"): row
+                    for row, message in zip(rows, messages)
+                    if not message
+                }
+            )
+        return [
+            message or f"Employee {row['name']} updated."
+            for row, message in zip(rows, messages)
+        ]
+
+    @timed("employees.remove")
     def remove(self, employee: Employee) -> str:
-        if self.__table.remove(Query().id == employee.id):
+        if self.__table.remove(employee.id):
             return f"Employee {employee.name} removed."
         else:
             return f"Employee not found."
@@ -0,0 +1,214 @@
+from collections import defaultdict
+from datetime import date as dt
+from typing import Iterable
+
+from models import Store
+
+from .database import Database
+from .rollups import MOVEMENT_TYPES
+
+
+class Gap:
+    """Stretch of a store's day with nobody on shift."""
+
+    __slots__ = ("store", "date", "start", "end")
+
+    def __init__(self, store: int, date: str, start: int, end: int):
+        self.store = store
+        self.date = date
+        self.start = start
+        self.end = end
+
+    @property
+    def minutes(self) -> int:
+        return self.end - self.start
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.date} store {self.store} "
+            f"{self.start // 60:02}:{self.start % 60:02}-"
+            f"{self.end // 60:02}:{self.end % 60:02}"
+        )
+
+    def __str__(self) -> str:
+        return repr(self)
+
+
+class LaborSummary:
+    """Labor figures of a set of sales reports.
+
+    Hours are keyed by employee or store ID, and ``headcount`` by hour of
+    day, as the average number of employees on shift during that hour of an
+    open day. ``overlap`` holds the hours with more than one employee on
+    shift, and ``sales_per_labor_hour`` the sales amount of the closed
+    reports over the labor hours they took.
+    """
+
+    __slots__ = (
+        "employee_hours",
+        "store_hours",
+        "headcount",
+        "overlap",
+        "gaps",
+        "sales",
+        "sales_per_labor_hour",
+        "unpaired",
+    )
+
+    def __init__(self):
+        self.employee_hours: dict[int, float] = {}
+        self.store_hours: dict[int, float] = {}
+        self.headcount: dict[int, float] = {}
+        self.overlap: dict[int, float] = {}
+        self.gaps: list[Gap] = []
+        self.sales: dict[int, float] = {}
+        self.sales_per_labor_hour: dict[int, float] = {}
+        self.unpaired = 0
+
+
+class LaborHours:
+    """Computes labor hours from the schedules of raw sales report rows.
+
+    Arrivals and departures are paired per employee and day, in time order,
+    and every shift becomes a pair of start and end events. A single sort of
+    all the events followed by one sweep yields the staffing of every store
+    day, so a year of reports of every store is analyzed without building
+    any model. Times are handled as minutes since midnight.
+    """
+
+    @staticmethod
+    def minutes(time: str) -> int:
+        return int(time[:2]) * 60 + int(time[3:5])
+
+    def rows(
+        self,
+        stores: Iterable[Store] | None = None,
+        date_from: dt | None = None,
+        date_to: dt | None = None,
+    ) -> Iterable[dict]:
+        """Read the reports of the stores, all of them by default, in range."""
+        table = Database().table("sales_reports")
+        low = date_from.strftime("%Y-%m-%d") if date_from else None
+        high = date_to.strftime("%Y-%m-%d") if date_to else None
+        if stores is None:
+            return table.ordered("date", low=low, high=high)
+        return (
+            row
+            for store in stores
+            for row in table.ordered("date", low=low, high=high, store=store.id)
+        )
+
+    def shifts(self, row: dict) -> tuple[list[tuple[int, int, int]], int]:
+        """Pair the arrivals and departures of a report per employee.
+
+        Returns the ``(employee, start, end)`` shifts, and how many arrivals
+        or departures had no match.
+        """
+        times: dict[int, tuple[list[int], list[int]]] = {}
+        for index, kind in enumerate(("arrivals", "departures")):
+            for entry in row["schedule"][kind]:
+                times.setdefault(entry["employee"], ([], []))[index].append(
+                    self.minutes(entry["time"])
+                )
+
+        shifts = []
+        unpaired = 0
+        for employee, (arrivals, departures) in times.items():
+            arrivals.sort()
+            departures.sort()
+            unpaired += abs(len(arrivals) - len(departures))
+            for start, end in zip(arrivals, departures):
+                if start < end:
+                    shifts.append((employee, start, end))
+                else:
+                    unpaired += 2
+        return shifts, unpaired
+
+    def summarize(self, rows: Iterable[dict]) -> LaborSummary:
+        """Compute the labor figures of the given report rows."""
+        summary = LaborSummary()
+        employee_minutes: dict[int, int] = defaultdict(int)
+        store_minutes: dict[int, int] = defaultdict(int)
+        closed_minutes: dict[int, int] = defaultdict(int)
+        sales: dict[int, float] = defaultdict(float)
+        events: list[tuple[int, str, int, int]] = []
+
+        for row in rows:
+            store = row["store"]
+            shifts, unpaired = self.shifts(row)
+            summary.unpaired += unpaired
+            worked = 0
+            for employee, start, end in shifts:
+                employee_minutes[employee] += end - start
+                worked += end - start
+                events.append((store, row["date"], start, 1))
+                events.append((store, row["date"], end, -1))
+            store_minutes[store] += worked
+
+            if row.get("sales") is not None:
+                closed_minutes[store] += worked
+                sales[store] += sum(
+                    row["sales"][type]["amount"] for type in MOVEMENT_TYPES
+                )
+
+        # Ends sort before starts at the same minute, so back to back shifts
+        # neither overlap nor leave a gap
+        events.sort()
+        hour_minutes = [0] * 24
+        overlap_minutes: dict[int, int] = defaultdict(int)
+        days = 0
+        day = None
+        staff = 0
+        previous = 0
+        for store, date, minute, change in events:
+            if (store, date) != day:
+                day = (store, date)
+                days += 1
+                staff = 0
+            elif minute > previous:
+                if staff == 0:
+                    summary.gaps.append(Gap(store, date, previous, minute))
+                elif staff > 1:
+                    overlap_minutes[store] += minute - previous
+                # Spread the staffed minutes over the hours of the day
+                start = previous
+                while start < minute:
+                    end = min(minute, (start // 60 + 1) * 60)
+                    hour_minutes[start // 60] += staff * (end - start)
+                    start = end
+            staff += change
+            previous = minute
+
+        summary.employee_hours = {
+            employee: round(minutes / 60, 2)
+            for employee, minutes in sorted(employee_minutes.items())
+        }
+        summary.store_hours = {
+            store: round(minutes / 60, 2)
+            for store, minutes in sorted(store_minutes.items())
+        }
+        summary.headcount = {
+            hour: round(minutes / 60 / days, 2)
+            for hour, minutes in enumerate(hour_minutes)
+            if minutes
+        }
+        summary.overlap = {
+            store: round(minutes / 60, 2)
+            for store, minutes in sorted(overlap_minutes.items())
+        }
+        summary.sales = {store: round(sales[store], 2) for store in sorted(sales)}
+        summary.sales_per_labor_hour = {
+            store: round(sales[store] / (closed_minutes[store] / 60), 2)
+            for store in sorted(sales)
+            if closed_minutes[store]
+        }
+        return summary
+
+    def analyze(
+        self,
+        stores: Iterable[Store] | None = None,
+        date_from: dt | None = None,
+        date_to: dt | None = None,
+    ) -> LaborSummary:
+        """Compute the labor figures of the stores' reports in the range."""
+        return self.summarize(self.rows(stores, date_from, date_to))
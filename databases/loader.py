@@ -0,0 +1,58 @@
+from typing import Iterable
+
+from models import Employee, SalesReport, Store
+
+from .database import Database
+from .metrics import timed
+
+
+class ReportLoader:
+    """Hydrates many sales reports resolving each reference only once.
+
+    Every referenced store and employee is built once and shared by all the
+    reports of the load, instead of being queried per report and per shift.
+    With ``lazy``, schedules and close counts are decoded on first read.
+    """
+
+    def __init__(self, lazy: bool = False):
+        self.lazy = lazy
+        self.stores: dict[int, Store] = {}
+        self.employees: dict[int, Employee] = {}
+
+    @staticmethod
+    def __references(rows: list[dict]) -> tuple[set[int], set[int]]:
+        store_ids = set()
+        employee_ids = set()
+        for row in rows:
+            store_ids.add(row["store"])
+            schedule = row["schedule"]
+            for shift in schedule["arrivals"]:
+                employee_ids.add(shift["employee"])
+            for shift in schedule["departures"]:
+                employee_ids.add(shift["employee"])
+        return store_ids, employee_ids
+
+    def resolve(self, rows: list[dict]):
+        """Fetch every store and employee referenced by the rows."""
+        store_ids, employee_ids = self.__references(rows)
+        store_ids -= self.stores.keys()
+        employee_ids -= self.employees.keys()
+
+        stores = Database().table("stores")
+        for id in store_ids:
+            if store := stores.get(id):
+                self.stores[id] = Store.from_dict(store)
+
+        employees = Database().table("employees")
+        for id in employee_ids:
+            if employee := employees.get(id):
+                self.employees[id] = Employee.from_dict(employee)
+
+    @timed("sales_reports.hydrate")
+    def load(self, rows: Iterable[dict]) -> list[SalesReport]:
+        rows = list(rows)
+        self.resolve(rows)
+        return [
+            SalesReport.from_dict(row, self.stores, self.employees, self.lazy)
+            for row in rows
+        ]
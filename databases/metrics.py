@@ -0,0 +1,152 @@
+import json
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+from typing import Any, Callable, TypeVar
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+BUCKETS = (0.05, 0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000, 5000)
+
+
+class Histogram:
+    __slots__ = ("count", "total", "min", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def add(self, elapsed: float):
+        self.count += 1
+        self.total += elapsed
+        self.min = min(self.min, elapsed)
+        self.max = max(self.max, elapsed)
+        self.buckets[bisect_left(BUCKETS, elapsed)] += 1
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "total_ms": round(self.total, 3),
+            "mean_ms": round(self.total / self.count, 3),
+            "min_ms": round(self.min, 3),
+            "max_ms": round(self.max, 3),
+            "buckets": {
+                str(bound): count
+                for bound, count in zip((*BUCKETS, "inf"), self.buckets)
+            },
+        }
+
+
+class Metrics:
+    """Process-wide latencies and counters of the data layer.
+
+    Nothing is recorded until ``enable`` is called, and instrumented code only
+    checks ``Metrics.enabled`` while it is off. Rows scanned are counted per
+    table and per outermost timed operation, so full table scans can be traced
+    back to the call that caused them. Work done in other processes, like
+    batch rendering, is not recorded.
+    """
+
+    enabled = False
+    __counters: dict[str, int] = {}
+    __latencies: dict[str, Histogram] = {}
+    __lock = threading.Lock()
+    __local = threading.local()
+
+    @classmethod
+    def enable(cls):
+        cls.enabled = True
+
+    @classmethod
+    def disable(cls):
+        cls.enabled = False
+
+    @classmethod
+    def reset(cls):
+        with cls.__lock:
+            cls.__counters.clear()
+            cls.__latencies.clear()
+
+    @classmethod
+    def count(cls, name: str, amount: int = 1):
+        if not cls.enabled:
+            return
+        with cls.__lock:
+            cls.__counters[name] = cls.__counters.get(name, 0) + amount
+
+    @classmethod
+    def observe(cls, name: str, elapsed: float):
+        """Record a latency in milliseconds."""
+        if not cls.enabled:
+            return
+        with cls.__lock:
+            if name not in cls.__latencies:
+                cls.__latencies[name] = Histogram()
+            cls.__latencies[name].add(elapsed)
+
+    @classmethod
+    def scanned(cls, table: str, rows: int, full: bool = False):
+        """Record the rows a query read, ``full`` if it read the whole table."""
+        if not cls.enabled:
+            return
+        cls.count(f"rows_scanned.{table}", rows)
+        if operations := getattr(cls.__local, "operations", None):
+            cls.count(f"rows_scanned.{operations[0]}", rows)
+        if full:
+            cls.count(f"full_scans.{table}")
+            if operations:
+                cls.count(f"full_scans.{operations[0]}")
+
+    @classmethod
+    def call(cls, name: str, function: Callable, args: tuple, kwargs: dict) -> Any:
+        """Run a function timing it as the operation ``name``."""
+        operations = getattr(cls.__local, "operations", None)
+        if operations is None:
+            operations = cls.__local.operations = []
+        operations.append(name)
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            cls.observe(name, (time.perf_counter() - start) * 1000)
+            operations.pop()
+
+    @classmethod
+    def snapshot(cls) -> dict:
+        """Retrieve a copy of everything recorded so far."""
+        with cls.__lock:
+            return {
+                "counters": dict(sorted(cls.__counters.items())),
+                "latencies": {
+                    name: histogram.to_dict()
+                    for name, histogram in sorted(cls.__latencies.items())
+                },
+            }
+
+    @classmethod
+    def export(cls, file_name: str) -> dict:
+        """Write a snapshot to a JSON file, and return it."""
+        snapshot = cls.snapshot()
+        with open(file_name, "w") as file:
+            json.dump(snapshot, file, indent=4)
+        return snapshot
+
+
+def timed(name: str) -> Callable[[F], F]:
+    """Time every call of the decorated function as the operation ``name``."""
+
+    def decorate(function: F) -> F:
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not Metrics.enabled:
+                return function(*args, **kwargs)
+            return Metrics.call(name, function, args, kwargs)
+
+        return wrapper  # type: ignore
+
+    return decorate
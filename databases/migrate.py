@@ -0,0 +1,76 @@
+import json
+import os
+
+from .sqlite import SQLiteDatabase
+
+
+def load(source: str) -> tuple[dict[str, list[dict]], dict[str, int]]:
+    """Read the tables and ID counters of a TinyDB JSON file and its shards.
+
+    Returns the rows of every table in ID order, and the next ID of every
+    table with a counter.
+    """
+    with open(source) as file:
+        data = json.load(file)
+
+    tables = {
+        name: sorted(rows.values(), key=lambda doc: doc["id"])
+        for name, rows in data.items()
+        if name != "_meta"
+    }
+    sequences = {
+        counter["sequence"]: counter["next"]
+        for counter in data.get("_meta", {}).values()
+    }
+
+    directory = f"{source}.shards"
+    for name in sorted(os.listdir(directory)) if os.path.isdir(directory) else []:
+        docs = []
+        for entry in os.listdir(os.path.join(directory, name)):
+            if entry == "manifest.json" or not entry.endswith(".json"):
+                continue
+            with open(os.path.join(directory, name, entry)) as file:
+                docs.extend(json.load(file))
+        with open(os.path.join(directory, name, "manifest.json")) as file:
+            sequences[name] = json.load(file)["next"]
+        tables[name] = sorted(tables.get(name, []) + docs, key=lambda doc: doc["id"])
+    return tables, sequences
+
+
+def migrate(source: str, target: str) -> dict[str, int]:
+    """Copy every table of a TinyDB JSON file into a SQLite database."""
+    tables, sequences = load(source)
+
+    database = SQLiteDatabase(target)
+    migrated = {}
+    with database.transaction():
+        for name, docs in tables.items():
+            database.table(name).insert_multiple(docs)
+            migrated[name] = len(docs)
+
+        for sequence, next in sequences.items():
+            database.execute(
+                "INSERT OR REPLACE INTO _meta (sequence, next) VALUES (?, ?)",
+                (sequence, next),
+            )
+    database.close()
+    return migrated
+
+
+def verify(source: str, target: str) -> list[str]:
+    """Compare a TinyDB JSON file with a SQLite database, row by row."""
+    tables, _ = load(source)
+
+    database = SQLiteDatabase(target)
+    mismatches = []
+    for name in sorted(tables.keys() | database.tables()):
+        expected = tables.get(name, [])
+        found = database.table(name).all()
+        if len(expected) != len(found):
+            mismatches.append(f"{name}: {len(expected)} rows, found {len(found)}.")
+            continue
+        for doc, row in zip(expected, found):
+            if doc != row:
+                mismatches.append(f"{name}: row {doc['id']} differs.")
+    database.close()
+    return mismatches
@@ -0,0 +1,176 @@
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable
+
+PrintCommand = Callable[[list[str], str | None], None]
+
+
+def system_print(file_names: list[str], printer: str | None = None):
+    """Send files to the system spooler, raising if it rejects them."""
+    import platform
+    import subprocess
+
+    if platform.system() == "Windows":
+        for file_name in file_names:
+            subprocess.run(["print", file_name], shell=True, check=True)
+    else:  # macOS, Linux or others
+        destination = ["-d", printer] if printer else []
+        subprocess.run(["lp", *destination, *file_names], check=True)
+
+
+class PrintJob:
+    __slots__ = (
+        "id",
+        "file_name",
+        "printer",
+        "status",
+        "attempts",
+        "error",
+        "retry_at",
+        "temporary",
+    )
+
+    def __init__(
+        self, id: int, file_name: str, printer: str | None, temporary: bool = False
+    ):
+        self.id = id
+        self.file_name = file_name
+        self.printer = printer
+        self.temporary = temporary
+        self.status = "queued"
+        self.attempts = 0
+        self.error: str | None = None
+        self.retry_at = 0.0
+
+    def __repr__(self) -> str:
+        return f"Print job {self.id} {self.status}"
+
+    def __str__(self) -> str:
+        return f"Print job {self.id} {self.status}"
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+
+class PrintSpooler:
+    """Background print queue served by a single worker thread.
+
+    Queued jobs for the same printer are sent together in one command, and
+    failed submissions are retried ``retries`` times ``retry_delay`` seconds
+    apart. ``submit`` blocks while ``max_queued`` jobs are waiting. The print
+    command can be swapped, e.g. for a stub in tests or headless setups.
+    """
+
+    def __init__(
+        self,
+        command: PrintCommand = system_print,
+        max_queued: int = 100,
+        batch_size: int = 20,
+        retries: int = 2,
+        retry_delay: float = 5.0,
+    ):
+        self.command = command
+        self.max_queued = max_queued
+        self.batch_size = batch_size
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.__ids = itertools.count(1)
+        self.__queue: deque[PrintJob] = deque()
+        self.__condition = threading.Condition()
+        self.__closed = False
+        self.__worker = threading.Thread(target=self.__work, daemon=True)
+        self.__worker.start()
+
+    def submit(
+        self, file_name: str, printer: str | None = None, temporary: bool = False
+    ) -> PrintJob:
+        """Queue a file for printing and return its job.
+
+        A ``temporary`` file is removed once the job is done or failed.
+        """
+        with self.__condition:
+            if self.__closed:
+                raise RuntimeError("The print spooler is closed.")
+            while len(self.__queue) >= self.max_queued:
+                self.__condition.wait()
+            job = PrintJob(next(self.__ids), file_name, printer, temporary)
+            self.__queue.append(job)
+            self.__condition.notify_all()
+        return job
+
+    def wait(self, job: PrintJob, timeout: float | None = None) -> str:
+        """Wait until the job is done or failed, and return its status."""
+        with self.__condition:
+            self.__condition.wait_for(lambda: job.finished, timeout)
+        return job.status
+
+    def close(self, wait: bool = True):
+        """Stop accepting jobs, finishing the queued ones if ``wait``."""
+        with self.__condition:
+            self.__closed = True
+            if not wait:
+                for job in self.__queue:
+                    job.status = "failed"
+                    job.error = "The print spooler was closed."
+                    self.__discard(job)
+                self.__queue.clear()
+            self.__condition.notify_all()
+        self.__worker.join()
+
+    @staticmethod
+    def __discard(job: PrintJob):
+        if job.temporary:
+            try:
+                os.remove(job.file_name)
+            except FileNotFoundError:
+                pass
+
+    def __next_batch(self) -> list[PrintJob] | None:
+        with self.__condition:
+            while True:
+                now = time.monotonic()
+                ready = [job for job in self.__queue if job.retry_at <= now]
+                if ready:
+                    break
+                if self.__closed and not self.__queue:
+                    return None
+                retry_at = min((job.retry_at for job in self.__queue), default=None)
+                self.__condition.wait(retry_at - now if retry_at else None)
+
+            printer = ready[0].printer
+            batch = [job for job in ready if job.printer == printer]
+            batch = batch[: self.batch_size]
+            for job in batch:
+                self.__queue.remove(job)
+                job.status = "printing"
+                job.attempts += 1
+            self.__condition.notify_all()
+            return batch
+
+    def __work(self):
+        while (batch := self.__next_batch()) is not None:
+            try:
+                self.command([job.file_name for job in batch], batch[0].printer)
+            except Exception as error:
+                failed = str(error) or type(error).__name__
+            else:
+                failed = None
+
+            with self.__condition:
+                for job in batch:
+                    job.error = failed
+                    if failed is None:
+                        job.status = "done"
+                        self.__discard(job)
+                    elif job.attempts > self.retries:
+                        job.status = "failed"
+                        self.__discard(job)
+                    else:
+                        job.status = "queued"
+                        job.retry_at = time.monotonic() + self.retry_delay
+                        self.__queue.append(job)
+                self.__condition.notify_all()
@@ -0,0 +1,146 @@
+from array import array
+from datetime import date as dt
+
+from models import Store
+from models.sales_report import MoneyCount
+
+from .database import Database
+
+
+class Discrepancy:
+    def __init__(self, report: int, store: int, date: str, kind: str, amount: float):
+        self.report = report
+        self.store = store
+        self.date = date
+        self.kind = kind
+        self.amount = amount
+
+    def __repr__(self) -> str:
+        return f"{self.date} store {self.store} {self.kind} {self.amount:+}"
+
+    def __str__(self) -> str:
+        return f"{self.date} store {self.store} {self.kind} {self.amount:+}"
+
+
+class CashReconciliation:
+    """Audits closed sales reports in column-wise passes.
+
+    The reports are loaded once into integer-cent columns (one per field),
+    then each check runs as a single pass over whole columns instead of dict
+    arithmetic per report. Money totals follow ``count_money``: negative
+    cent counts are ignored.
+    """
+
+    def __init__(self, tolerance: float = 0.0):
+        self.tolerance = round(tolerance * 100)
+
+    @staticmethod
+    def __money_column(money: list[dict]) -> array:
+        return MoneyCount.batch_totals([MoneyCount.from_dict(m) for m in money])
+
+    @staticmethod
+    def __cents_column(values: list[float]) -> array:
+        return array("q", [round(value * 100) for value in values])
+
+    def load(
+        self,
+        store: Store | None = None,
+        date_from: dt | None = None,
+        date_to: dt | None = None,
+    ) -> dict[str, list | array]:
+        """Load the closed reports into columns."""
+        rows = [
+            row
+            for row in Database()
+            .table("sales_reports")
+            .ordered(
+                "date",
+                low=date_from.strftime("%Y-%m-%d") if date_from else None,
+                high=date_to.strftime("%Y-%m-%d") if date_to else None,
+                **({"store": store.id} if store else {}),
+            )
+            if row.get("sales") is not None
+        ]
+        counts_open = [row["counts_open"] for row in rows]
+        counts_close = [row["counts_close"] for row in rows]
+        return {
+            "id": array("q", [row["id"] for row in rows]),
+            "store": array("q", [row["store"] for row in rows]),
+            "date": [row["date"] for row in rows],
+            "money_open": self.__money_column([row["money_open"] for row in rows]),
+            "money_close": self.__money_column([row["money_close"] for row in rows]),
+            "cash_sales": self.__cents_column(
+                [row["sales"]["cash"]["amount"] for row in rows]
+            ),
+            "cash_returns": self.__cents_column(
+                [row["returns"]["cash"]["amount"] for row in rows]
+            ),
+            "littmanns": array(
+                "q",
+                [
+                    close["littmanns"] - open["littmanns"]
+                    for open, close in zip(counts_open, counts_close)
+                ],
+            ),
+            "gift_fifty": array(
+                "q",
+                [
+                    close["gift_cards"]["fifty"] - open["gift_cards"]["fifty"]
+                    for open, close in zip(counts_open, counts_close)
+                ],
+            ),
+            "gift_t_five": array(
+                "q",
+                [
+                    close["gift_cards"]["t_five"] - open["gift_cards"]["t_five"]
+                    for open, close in zip(counts_open, counts_close)
+                ],
+            ),
+        }
+
+    def audit(
+        self,
+        store: Store | None = None,
+        date_from: dt | None = None,
+        date_to: dt | None = None,
+    ) -> list[Discrepancy]:
+        """Retrieve every cash difference above the tolerance.
+
+        Also flags littmann and gift card counts that went up during the day,
+        since the close count can only drop through sales.
+        """
+        columns = self.load(store, date_from, date_to)
+
+        # Close money minus open money, cash sales and cash returns
+        cash = [
+            close - open - sales + returns
+            for close, open, sales, returns in zip(
+                columns["money_close"],
+                columns["money_open"],
+                columns["cash_sales"],
+                columns["cash_returns"],
+            )
+        ]
+        flagged = [
+            (position, "cash", difference / 100)
+            for position, difference in enumerate(cash)
+            if abs(difference) > self.tolerance
+        ]
+        for kind in ("littmanns", "gift_fifty", "gift_t_five"):
+            flagged += [
+                (position, kind, delta)
+                for position, delta in enumerate(columns[kind])
+                if delta > 0
+            ]
+
+        discrepancies = [
+            Discrepancy(
+                columns["id"][position],
+                columns["store"][position],
+                columns["date"][position],
+                kind,
+                amount,
+            )
+            for position, kind, amount in flagged
+        ]
+        return sorted(discrepancies, key=lambda d: (d.store, d.date, d.kind))
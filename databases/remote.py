@@ -0,0 +1,181 @@
+import json
+import os
+import socket
+import threading
+from contextlib import contextmanager
+from typing import Any, Iterable, Iterator, Mapping
+
+from .metrics import Metrics
+from .tables import ConflictError, DuplicateError
+
+
+def parse_address(address: str) -> str | tuple[str, int]:
+    """Split a ``host:port`` address, anything else is a Unix socket path."""
+    host, _, port = address.rpartition(":")
+    if host and port.isdigit() and os.sep not in address:
+        return host, int(port)
+    return address
+
+
+class RemoteTable:
+    """Table served by a ``DatabaseServer``, with the interface of ``IndexedTable``.
+
+    Every call is a request to the server, which runs it on its own table.
+    ``ordered`` fetches ``page_size`` documents at a time as it is iterated,
+    each page starting after the field value and ID of the last one.
+    """
+
+    page_size = 500
+
+    def __init__(self, database: "RemoteDatabase", name: str):
+        self.__database = database
+        self.name = name
+
+    def __call(
+        self, method: str, *args: Any, page: dict | None = None, **kwargs: Any
+    ) -> Any:
+        return self.__database.request(
+            {
+                "op": "call",
+                "table": self.name,
+                "method": method,
+                "args": args,
+                "kwargs": kwargs,
+                **(page or {}),
+            }
+        )
+
+    def __len__(self) -> int:
+        return self.__call("__len__")
+
+    @property
+    def version(self) -> tuple[int, int]:
+        """Changes whenever the table is written, by any client."""
+        return tuple(self.__call("version"))  # type: ignore
+
+    def allocate_ids(self, count: int = 1) -> range:
+        """Reserve a block of consecutive IDs for new documents."""
+        return range(*self.__call("allocate_ids", count))
+
+    def all(self) -> list[dict]:
+        return self.__call("all")
+
+    def get(self, id: int) -> dict | None:
+        return self.__call("get", id)
+
+    def lookup(self, **fields: Any) -> dict | None:
+        """Retrieve the document matching every given field."""
+        return self.__call("lookup", **fields)
+
+    def ordered(
+        self, field: str, low: Any = None, high: Any = None, **fields: Any
+    ) -> Iterator[dict]:
+        """Iterate the documents matching ``fields`` in order of ``field``."""
+        after = None
+        while True:
+            page = self.__call(
+                "ordered",
+                field,
+                low,
+                high,
+                page={"after": after, "limit": self.page_size},
+                **fields,
+            )
+            yield from page
+            if len(page) < self.page_size:
+                return
+            # The next page starts after the last document of this one
+            after = [page[-1][field], page[-1]["id"]]
+
+    def insert(self, doc: Mapping) -> int:
+        return self.__call("insert", doc)
+
+    def insert_multiple(self, docs: Iterable[Mapping]) -> list[int]:
+        return self.__call("insert_multiple", list(docs))
+
+    def update(self, id: int, fields: Mapping, version: int | None = None) -> bool:
+        return self.__call("update", id, fields, version)
+
+    def update_many(self, changes: Mapping[int, Mapping]) -> int:
+        """Update several documents by ID, returning how many were found."""
+        # JSON object keys are strings, so the changes travel as pairs
+        return self.__call("update_many", list(changes.items()))
+
+    def remove(self, id: int) -> bool:
+        return self.__call("remove", id)
+
+
+class RemoteDatabase:
+    """Connection to a ``DatabaseServer`` holding the repository tables.
+
+    Requests are JSON lines over one socket per process, a Unix socket for a
+    path address or TCP for ``host:port``.
+    """
+
+    def __init__(self, address: str):
+        self.path = address
+        self.__address = parse_address(address)
+        self.__lock = threading.RLock()
+        self.__socket: socket.socket | None = None
+        self.__file: Any = None
+        self.__pid: int | None = None
+        self.__tables: dict[str, RemoteTable] = {}
+
+    def __connect(self):
+        family = socket.AF_INET if isinstance(self.__address, tuple) else socket.AF_UNIX
+        self.__socket = socket.socket(family, socket.SOCK_STREAM)
+        self.__socket.connect(self.__address)
+        self.__file = self.__socket.makefile("rwb")
+        self.__pid = os.getpid()
+
+    def request(self, message: dict) -> Any:
+        """Send a request to the server and return its result."""
+        with self.__lock:
+            # Forked processes must not share the parent's connection
+            if self.__pid != os.getpid():
+                self.__connect()
+            self.__file.write(json.dumps(message).encode() + b"\n")
+            self.__file.flush()
+            line = self.__file.readline()
+        if Metrics.enabled:
+            Metrics.count("remote.requests")
+        if not line:
+            raise ConnectionError("The database server closed the connection.")
+
+        response = json.loads(line)
+        if response.get("conflict"):
+            raise ConflictError(response["error"])
+        if response.get("duplicate"):
+            raise DuplicateError(response["error"])
+        if "error" in response:
+            raise RuntimeError(response["error"])
+        return response["result"]
+
+    @contextmanager
+    def batch(self) -> Iterator["RemoteDatabase"]:
+        """Run the enclosed requests as one batch, holding other clients back."""
+        with self.__lock:
+            self.request({"op": "begin"})
+            try:
+                yield self
+            except BaseException:
+                self.request({"op": "end", "abort": True})
+                raise
+            self.request({"op": "end"})
+
+    def flush(self):
+        """Have the server write its pending changes to disk."""
+        self.request({"op": "flush"})
+
+    def table(self, name: str) -> RemoteTable:
+        if name not in self.__tables:
+            self.__tables[name] = RemoteTable(self, name)
+        return self.__tables[name]
+
+    def close(self):
+        with self.__lock:
+            if self.__socket is not None and self.__pid == os.getpid():
+                self.__file.close()
+                self.__socket.close()
+            self.__socket = None
+            self.__pid = None
@@ -0,0 +1,83 @@
+import hashlib
+import json
+import os
+import tempfile
+from collections import OrderedDict
+
+# Shared by the processes of the machine, wherever they run from
+DEFAULT_DIRECTORY = os.path.join(tempfile.gettempdir(), "report_cache")
+
+
+class RenderCache:
+    """Rendered PDFs on disk, addressed by a hash of what they show.
+
+    Files are evicted least recently used first once the cache grows past
+    ``max_bytes``, so a file that must outlive its next use is copied out.
+    """
+
+    def __init__(self, directory: str = DEFAULT_DIRECTORY, max_bytes: int = 64 << 20):
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+        files = sorted(
+            (
+                entry
+                for entry in os.scandir(self.directory)
+                if entry.name.endswith(".pdf")
+            ),
+            key=lambda entry: entry.stat().st_mtime_ns,
+        )
+        self.__entries: OrderedDict[str, int] = OrderedDict(
+            (entry.name[:-4], entry.stat().st_size) for entry in files
+        )
+        self.__size = sum(self.__entries.values())
+
+    @staticmethod
+    def key(content: dict) -> str:
+        """Hash the content a rendered file depends on."""
+        serialized = json.dumps(content, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(serialized.encode()).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pdf")
+
+    def get(self, key: str) -> bytes | None:
+        if key in self.__entries:
+            try:
+                with open(self.path(key), "rb") as file:
+                    data = file.read()
+            except FileNotFoundError:
+                self.__size -= self.__entries.pop(key)
+            else:
+                self.hits += 1
+                self.__entries.move_to_end(key)
+                os.utime(self.path(key))
+                return data
+
+        self.misses += 1
+        return None
+
+    def put(self, key: str, data: bytes):
+        # Written under a name of its own, so processes putting the same
+        # file at once don't write into each other's
+        fd, temporary = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(data)
+            os.replace(temporary, self.path(key))
+        except BaseException:
+            os.remove(temporary)
+            raise
+
+        self.__size += len(data) - self.__entries.pop(key, 0)
+        self.__entries[key] = len(data)
+        while self.__size > self.max_bytes and len(self.__entries) > 1:
+            evicted, size = self.__entries.popitem(last=False)
+            self.__size -= size
+            try:
+                os.remove(self.path(evicted))
+            except FileNotFoundError:
+                pass
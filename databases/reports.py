@@ -0,0 +1,263 @@
+from typing import BinaryIO
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.units import inch
+from reportlab.platypus import (
+    Image,
+    PageBreak,
+    Paragraph,
+    ParagraphAndImage,
+    SimpleDocTemplate,
+    Table,
+    TableStyle,
+)
+
+from models import SalesReport
+from models.sales_report import Counts, MoneyCount, Movements
+
+from .metrics import timed
+
+# Shown in the report header, and part of every render cache key
+TEMPLATE_VERSION = "v8"
+
+
+class ReportTemplate:
+    """Static parts of the sales report page, built once per process.
+
+    Holds the decoded logo, the parsed header and every table style, so a
+    render only lays out the data of its report.
+    """
+
+    __instance: "ReportTemplate | None" = None
+
+    def __init__(self):
+        ## HEADER ##
+        image = Image("assets/scrubs_logo.png", 330 / 2.5, 149 / 2.5, lazy=0)
+
+        title_text = f"""<font name=Helvetica-Bold color=black size=19>Daily Sales Report</font> <font name=Helvetica color=grey size=8>{TEMPLATE_VERSION}</font><br/>
+        <font name=Helvetica color=grey size=12>Scrubs Boutique and More LLC</font>"""
+        self.header = ParagraphAndImage(Paragraph(title_text), image, ypad=20)
+
+        ## DATA ##
+        self.data_style = TableStyle(
+            [
+                ("ALIGN", (0, 0), (-1, -1), "CENTER"),
+                ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+                ("FONTSIZE", (0, 0), (-1, 0), 18),
+                ("FONTSIZE", (0, 1), (-1, 1), 14),
+                ("TEXTCOLOR", (0, 0), (-1, 0), colors.black),
+                ("TEXTCOLOR", (0, 1), (-1, 1), colors.grey),
+                ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+            ]
+        )
+
+        ## COUNTS ##
+        self.counts_style = TableStyle(
+            [
+                ("ALIGN", (0, 0), (-1, -1), "CENTER"),
+                ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+                ("FONTSIZE", (0, 0), (-1, 0), 23),
+                ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+            ]
+        )
+        self.money_style = TableStyle(
+            [
+                ("ALIGN", (0, 0), (-1, -1), "CENTER"),
+                ("ALIGN", (0, -2), (1, -1), "RIGHT"),
+                ("BOX", (2, -5), (-1, -3), 0.5, colors.grey),
+                ("FONTNAME", (0, 0), (0, -1), "Helvetica-Bold"),
+                ("FONTNAME", (-2, 0), (-2, -3), "Helvetica-Bold"),
+                ("LINEABOVE", (2, -4), (-1, -4), 0.5, colors.grey),
+                ("SPAN", (2, 4), (-1, 4)),
+                ("SPAN", (2, -1), (-1, -1)),
+                ("SPAN", (0, -2), (1, -2)),
+                ("SPAN", (0, -1), (1, -1)),
+                ("SPAN", (-2, -2), (-1, -2)),
+                ("TEXTCOLOR", (1, 0), (1, -3), colors.grey),
+                ("TEXTCOLOR", (3, 0), (3, -3), colors.grey),
+                ("TEXTCOLOR", (2, -2), (2, -1), colors.grey),
+            ]
+        )
+
+        ## MOVEMENTS ##
+        self.movements_style = TableStyle(
+            [
+                ("SPAN", (0, 0), (-1, 0)),
+                ("SPAN", (0, -1), (-1, -1)),
+                ("FONTNAME", (0, 0), (-1, 1), "Helvetica-Bold"),
+                # ("FONTNAME", (0, -1), (0, -1), "Helvetica-Bold"),
+                ("FONTSIZE", (0, 0), (-1, 0), 23),
+                ("FONTSIZE", (0, 1), (-1, 1), 15),
+                ("FONTSIZE", (0, -1), (-1, -1), 13),
+                ("LINEABOVE", (0, -1), (-1, -1), 0.5, colors.grey),
+                ("ALIGN", (0, 0), (-1, -1), "CENTER"),
+                ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+                ("TEXTCOLOR", (0, 2), (-1, 2), colors.grey),
+                ("TEXTCOLOR", (0, -1), (-1, -1), colors.grey),
+            ]
+        )
+        self.movements_rows = [
+            0.65 * inch,
+            0.45 * inch,
+            0.28 * inch,
+            0.28 * inch,
+            0.35 * inch,
+        ]
+
+    @classmethod
+    def get(cls) -> "ReportTemplate":
+        """Retrieve the template of this process, building it on first use."""
+        if cls.__instance is None:
+            cls.__instance = cls()
+        return cls.__instance
+
+    def counts_table(self, money: MoneyCount | None, counts: Counts | None) -> Table:
+        bills = money.bills if money else {}
+        cents = money.cents if money else {}
+        gift_cards = counts.gift_cards if counts else None
+
+        return Table(
+            [
+                ["$100", bills.get("100", 0), "¢25", cents.get("25", 0)],
+                ["$50", bills.get("50", 0), "¢10", cents.get("10", 0)],
+                ["$20", bills.get("20", 0), "¢5", cents.get("5", 0)],
+                ["$10", bills.get("10", 0), "¢1", cents.get("1", 0)],
+                ["$5", bills.get("5", 0), "Gift cards", ""],
+                [
+                    "$2",
+                    bills.get("2", 0),
+                    50,
+                    gift_cards.fifty if gift_cards else 0,
+                ],
+                [
+                    "$1",
+                    bills.get("1", 0),
+                    25,
+                    gift_cards.t_five if gift_cards else 0,
+                ],
+                ["Littmanns", "", counts.littmanns if counts else 0, ""],
+                ["Total", "", f"${money.total if money else 0}", ""],
+            ],
+            style=self.money_style,
+        )
+
+    def movements_table(self, title: str, movements: Movements | None) -> Table:
+        if movements:
+            amounts = [
+                movements.card.amount,
+                movements.cash.amount,
+                movements.gift.amount,
+            ]
+            counts = [movements.card.qty, movements.cash.qty, movements.gift.qty]
+            count = movements.count
+            amount = movements.amount
+        else:
+            amounts = [0, 0, 0]
+            counts = [0, 0, 0]
+            count = 0
+            amount = 0
+        return Table(
+            [
+                [title, "", ""],
+                ["Cash", "Card", "Gift card"],
+                counts,
+                [f"${amounts[0]}", f"${amounts[1]}", f"${amounts[2]}"],
+                [f"{count}  ◊  ${amount}", "", ""],
+            ],
+            colWidths=[1.5 * inch],
+            rowHeights=self.movements_rows,
+            style=self.movements_style,
+        )
+
+    def elements(self, sales_report: SalesReport) -> list:
+        """Build the flowables of a sales report page."""
+        elements = [self.header]
+
+        ## DATA ##
+        store_name = sales_report.store.name
+        store_open, store_close = sales_report.schedule.working_hours
+        working_hours = store_close.hour - store_open.hour
+        date = sales_report.date.strftime("%B %d, %Y")
+
+        data = Table(
+            [["Store", "Hours", "Date"], [store_name, working_hours, date]],
+            colWidths=[2.5 * inch],
+            rowHeights=[0.45 * inch, 0.3 * inch],
+            style=self.data_style,
+            spaceBefore=65,
+        )
+        elements.append(data)
+
+        ## COUNTS ##
+        open_counts = self.counts_table(
+            sales_report.money_open, sales_report.counts_open
+        )
+        close_counts = self.counts_table(
+            sales_report.money_close, sales_report.counts_close
+        )
+
+        counts = Table(
+            [["Open Money", "Close Money"], [open_counts, close_counts]],
+            rowHeights=[0.5 * inch, 2.75 * inch],
+            style=self.counts_style,
+            spaceBefore=30,
+        )
+        elements.append(counts)
+
+        ## SALES ##
+        elements.append(self.movements_table("Sales", sales_report.sales))
+
+        ## RETURNS ##
+        elements.append(self.movements_table("Returns", sales_report.returns))
+        return elements
+
+    def document(self, output: str | BinaryIO) -> SimpleDocTemplate:
+        pdf = SimpleDocTemplate(output, pagesize=letter)
+
+        # Set attributes
+        pdf.title = "Daily Sales Report"
+        pdf.author = "Diego Balestra"
+        pdf.creator = "Scrubs Boutique and More"
+
+        pdf.topMargin = 5
+        pdf.bottomMargin = 5
+        pdf.leftMargin = 20
+        pdf.rightMargin = 20
+        return pdf
+
+
+def build_report_elements(sales_report: SalesReport) -> list:
+    """Build the flowables of a sales report page."""
+    return ReportTemplate.get().elements(sales_report)
+
+
+@timed("pdf.build")
+def render_report(sales_report: SalesReport, output: str | BinaryIO) -> str | BinaryIO:
+    """Render a sales report into a PDF file or any writable binary stream."""
+    template = ReportTemplate.get()
+    template.document(output).build(template.elements(sales_report))
+    return output
+
+
+@timed("pdf.build_many")
+def render_reports(sales_reports: list[SalesReport], file_name: str) -> dict[int, str]:
+    """Render many sales reports into one PDF file, a page each.
+
+    Returns the error of every report that could not be rendered.
+    """
+    elements = []
+    errors = {}
+    for sales_report in sales_reports:
+        try:
+            page = build_report_elements(sales_report)
+        except Exception as error:
+            errors[sales_report.id] = str(error)
+            continue
+        if elements:
+            elements.append(PageBreak())
+        elements.extend(page)
+
+    if elements:
+        ReportTemplate.get().document(file_name).build(elements)
+    return errors
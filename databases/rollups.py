@@ -0,0 +1,216 @@
+from datetime import date as dt
+from datetime import timedelta
+from typing import Iterable
+
+from models import SalesRollup, Store
+from models.sales_report import parse_date
+
+from .database import Database
+
+PERIODS = ("day", "week", "month")
+MOVEMENT_TYPES = ("cash", "card", "gift")
+# Rollup fields of each movement type, built once rather than per report
+MOVEMENT_FIELDS = {
+    kind: [
+        (type, f"{kind}_{type}_qty", f"{kind}_{type}_amount") for type in MOVEMENT_TYPES
+    ]
+    for kind in ("sales", "returns")
+}
+
+
+class SalesRollups:
+    """Per store totals of the closed sales reports by day, week and month.
+
+    The totals are updated as each report closes, so period queries read a
+    few rollup rows instead of every sales report of the period.
+    """
+
+    def __init__(self):
+        self.__table = Database().table("sales_rollups")
+
+    @staticmethod
+    def period_start(date: dt, period: str) -> dt:
+        """Retrieve the first day of the period containing the date."""
+        if period == "week":
+            return date - timedelta(days=date.weekday())
+        if period == "month":
+            return date.replace(day=1)
+        return date
+
+    @staticmethod
+    def totals(sales_report: dict) -> dict[str, float]:
+        """Compute the totals a closed sales report adds to its periods."""
+        totals: dict[str, float] = {"reports": 1}
+        for kind, fields in MOVEMENT_FIELDS.items():
+            movements = sales_report[kind]
+            count = amount = 0
+            for type, qty_key, type_amount_key in fields:
+                qty = totals[qty_key] = movements[type]["qty"]
+                type_amount = totals[type_amount_key] = movements[type]["amount"]
+                count += qty
+                amount += type_amount
+            totals[f"{kind}_count"] = count
+            totals[f"{kind}_amount"] = amount
+
+        totals["net_cash"] = (
+            sales_report["sales"]["cash"]["amount"]
+            - sales_report["returns"]["cash"]["amount"]
+        )
+
+        counts_open = sales_report["counts_open"]
+        counts_close = sales_report["counts_close"]
+        totals["littmanns"] = counts_close["littmanns"] - counts_open["littmanns"]
+        for card in ("fifty", "t_five"):
+            totals[f"gift_{card}"] = (
+                counts_close["gift_cards"][card] - counts_open["gift_cards"][card]
+            )
+        return {
+            key: round(value, 2) if isinstance(value, float) else value
+            for key, value in totals.items()
+        }
+
+    @staticmethod
+    def __merge(current: dict[str, float], totals: dict[str, float]) -> dict:
+        return {
+            key: round(current.get(key, 0) + value, 2) for key, value in totals.items()
+        }
+
+    def add(self, sales_report: dict):
+        """Add a closed sales report to its day, week and month rollups."""
+        self.add_many([sales_report])
+
+    def add_many(self, sales_reports: Iterable[dict]):
+        """Add closed sales reports to their rollups, merging them first.
+
+        Every rollup touched is written once, and the new ones are inserted
+        together.
+        """
+        merged: dict[tuple, dict[str, float]] = {}
+        starts: dict[str, list[tuple[str, str]]] = {}
+        for sales_report in sales_reports:
+            totals = self.totals(sales_report)
+            if sales_report["date"] not in starts:
+                date = parse_date(sales_report["date"])
+                starts[sales_report["date"]] = [
+                    (period, self.period_start(date, period).strftime("%Y-%m-%d"))
+                    for period in PERIODS
+                ]
+            for period, start in starts[sales_report["date"]]:
+                key = (sales_report["store"], period, start)
+                # Summed as is, and rounded once the period is complete
+                if key not in merged:
+                    merged[key] = dict(totals)
+                    continue
+                current = merged[key]
+                for field, value in totals.items():
+                    current[field] += value
+
+        if not merged:
+            return
+        # Read the current rollups holding the batch, so no other process
+        # can add to them before they are written back. A single range scan
+        # finds them all, rather than a lookup per rollup.
+        stores = {store for store, _, _ in merged}
+        starts = [start for _, _, start in merged]
+        with Database().batch():
+            rollups = {
+                (row["store"], row["period"], row["start"]): row
+                for row in self.__table.ordered(
+                    "start",
+                    low=min(starts),
+                    high=max(starts),
+                    **({"store": stores.pop()} if len(stores) == 1 else {}),
+                )
+            }
+            updates = {}
+            new = []
+            for key, totals in merged.items():
+                totals = {
+                    field: round(value, 2) if isinstance(value, float) else value
+                    for field, value in totals.items()
+                }
+                rollup = rollups.get(key)
+                if rollup:
+                    totals = self.__merge(rollup["totals"], totals)
+                    updates[rollup["id"]] = {"totals": totals}
+                else:
+                    new.append((*key, totals))
+
+            if updates:
+                self.__table.update_many(updates)
+            if not new:
+                return
+            ids = Database.get_next_ids(self.__table, len(new))
+            self.__table.insert_multiple(
+                {
+                    "id": id,
+                    "store": store,
+                    "period": period,
+                    "start": start,
+                    "totals": totals,
+                }
+                for id, (store, period, start, totals) in zip(ids, new)
+            )
+
+    def find(
+        self,
+        store: Store,
+        period: str,
+        date_from: dt | None = None,
+        date_to: dt | None = None,
+    ) -> list[SalesRollup]:
+        """Retrieve the store's rollups of a period kind, in date order."""
+        rows = self.__table.ordered(
+            "start",
+            low=(
+                self.period_start(date_from, period).strftime("%Y-%m-%d")
+                if date_from
+                else None
+            ),
+            high=date_to.strftime("%Y-%m-%d") if date_to else None,
+            store=store.id,
+            period=period,
+        )
+        return [SalesRollup.from_dict(row, store) for row in rows]
+
+    def rebuild(self) -> list[str]:
+        """Recompute every rollup from the sales reports.
+
+        Returns the differences found with the stored rollups.
+        """
+        expected: dict[tuple, dict[str, float]] = {}
+        for sales_report in Database().table("sales_reports").all():
+            if sales_report.get("sales") is None:
+                continue
+            totals = self.totals(sales_report)
+            date = parse_date(sales_report["date"])
+            for period in PERIODS:
+                start = self.period_start(date, period).strftime("%Y-%m-%d")
+                key = (sales_report["store"], period, start)
+                expected[key] = self.__merge(expected.get(key, {}), totals)
+
+        mismatches = []
+        stored = {
+            (row["store"], row["period"], row["start"]): row
+            for row in self.__table.all()
+        }
+        for key in sorted(expected.keys() | stored.keys()):
+            row = stored.get(key)
+            if not row or row["totals"] != expected.get(key):
+                mismatches.append(f"Rollup {' '.join(map(str, key))} differs.")
+
+        with Database().batch():
+            for row in stored.values():
+                self.__table.remove(row["id"])
+            ids = Database.get_next_ids(self.__table, len(expected))
+            self.__table.insert_multiple(
+                {
+                    "id": id,
+                    "store": store,
+                    "period": period,
+                    "start": start,
+                    "totals": totals,
+                }
+                for id, ((store, period, start), totals) in zip(ids, expected.items())
+            )
+        return mismatches
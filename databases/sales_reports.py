@@ -1,68 +1,114 @@
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.units import inch
-from reportlab.platypus import (
-    Image,
-    Paragraph,
-    ParagraphAndImage,
-    SimpleDocTemplate,
-    Table,
-    TableStyle,
-)
-from tinydb import Query
-
-from helpers import count_money, get_today_date
+import atexit
+import os
+import tempfile
+from datetime import date as dt
+from io import BytesIO
+from itertools import islice
+from typing import BinaryIO, Callable, Iterator
+
+from helpers import get_today_date
 from models import SalesReport, Store
 from models.sales_report import Counts, MoneyCount, Movements, Schedule
 
 from .database import Database
+from .loader import ReportLoader
+from .metrics import timed
+from .printing import PrintJob, PrintSpooler
+from .render_cache import RenderCache
+from .rollups import SalesRollups
+from .tables import ConflictError
+
+
+class ReportResult:
+    __slots__ = ("sales_report", "file_name", "error")
+
+    def __init__(
+        self, sales_report: int, file_name: str | None, error: str | None = None
+    ):
+        self.sales_report = sales_report
+        self.file_name = file_name
+        self.error = error
+
+    def __repr__(self) -> str:
+        return f"{self.sales_report}: {self.error or self.file_name}"
 
 
 class SalesReports:
+    render_cache: RenderCache | None = None
+    spooler: PrintSpooler | None = None
+
     def __init__(self):
-        self.__table = Database().db.table("sales_reports")
+        self.__table = Database().table("sales_reports")
 
     @property
+    @timed("sales_reports.list")
     def sales_report_list(self) -> list[SalesReport]:
-        return sorted(
-            [SalesReport.from_dict(sr) for sr in self.__table.all()],
-            key=lambda sr: sr.date,
+        return list(self.find())
+
+    def find(
+        self,
+        store: Store | None = None,
+        date_from: dt | None = None,
+        date_to: dt | None = None,
+        closed: bool | None = None,
+        limit: int | None = None,
+        offset: int = 0,
+        lazy: bool = False,
+    ) -> Iterator[SalesReport]:
+        """Iterate the matching sales reports in date order.
+
+        Reports are read through the date index and only the ones yielded
+        are deserialized, so a page costs the same whatever the history size.
+        With ``lazy``, schedules and close counts are decoded on first read.
+        """
+        rows = self.__table.ordered(
+            "date",
+            low=date_from.strftime("%Y-%m-%d") if date_from else None,
+            high=date_to.strftime("%Y-%m-%d") if date_to else None,
+            **({"store": store.id} if store else {}),
         )
+        if closed is not None:
+            rows = (row for row in rows if (row.get("sales") is not None) == closed)
 
-    def __check_open(self, date: str) -> bool:
-        return bool(Database.check_existence(self.__table, date=date))
+        loader = ReportLoader(lazy)
+        stop = offset + limit if limit is not None else None
+        for row in islice(rows, offset, stop):
+            yield from loader.load([row])
 
-    def __check_close(self, date: str) -> bool:
-        if Database.check_existence(self.__table, date=date):
-            return bool(
-                self.__table.search(Query().date == date and Query().sales != None)
-            )
-        return False
+    def __check_open(self, store: int, date: str) -> bool:
+        return bool(self.__table.lookup(store=store, date=date))
+
+    def __check_close(self, store: int, date: str) -> bool:
+        sales_report = self.__table.lookup(store=store, date=date)
+        return bool(sales_report) and sales_report.get("sales") is not None
 
+    @timed("sales_reports.open")
     def open(
         self, store: Store, schedule: Schedule, money_count: MoneyCount, counts: Counts
     ) -> str:
         today_date = get_today_date()
 
-        if self.__check_close(today_date):
-            return "The store already closed today."
-
-        if self.__check_open(today_date):
-            return "The store already opened today."
-
-        id = Database.get_next_id(self.__table)
-        self.__table.insert(
-            {
-                "id": id,
-                "date": today_date,
-                "store": store.id,
-                "schedule": schedule.to_dict(),
-                "money_open": money_count.to_dict(),
-                "counts_open": counts.to_dict(),
-            }
-        )
+        with Database().batch():
+            if self.__check_close(store.id, today_date):
+                return "The store already closed today."
+
+            if self.__check_open(store.id, today_date):
+                return "The store already opened today."
+
+            id = Database.get_next_id(self.__table)
+            self.__table.insert(
+                {
+                    "id": id,
+                    "date": today_date,
+                    "store": store.id,
+                    "schedule": schedule.to_dict(),
+                    "money_open": money_count.to_dict(),
+                    "counts_open": counts.to_dict(),
+                }
+            )
         return f"Store's sales report {id} for {today_date} started."
 
+    @timed("sales_reports.close")
     def close(
         self,
         sales_report: SalesReport,
@@ -71,222 +117,169 @@ class SalesReports:
         returns: Movements,
         sales: Movements,
     ) -> str:
-        if not self.__check_open(sales_report.date.strftime("%Y-%m-%d")):
-            return "The store hasn't open yet."
-
-        if self.__check_close(sales_report.date.strftime("%Y-%m-%d")):
-            return "The store already closed."
-
-        self.__table.update(
-            {
-                "money_close": money_count.to_dict(),
-                "counts_close": counts.to_dict(),
-                "returns": returns.to_dict(),
-                "sales": sales.to_dict(),
-            },
-            Query().id == sales_report.id,
-        )
+        store = sales_report.store.id
+        date = sales_report.date.strftime("%Y-%m-%d")
+
+        # Check and close while holding the write lock, so a report is never
+        # closed, and added to the rollups, twice
+        with Database().batch():
+            if not self.__check_open(store, date):
+                return "The store hasn't open yet."
+
+            if self.__check_close(store, date):
+                return "The store already closed."
+
+            try:
+                self.__table.update(
+                    sales_report.id,
+                    {
+                        "money_close": money_count.to_dict(),
+                        "counts_close": counts.to_dict(),
+                        "returns": returns.to_dict(),
+                        "sales": sales.to_dict(),
+                    },
+                    sales_report.version,
+                )
+            except ConflictError as error:
+                return str(error)
+            SalesRollups().add(self.__table.get(sales_report.id))  # type: ignore
         return f"Store's sales report {sales_report.id} closed."
 
-    def generate_report(self, sales_report: SalesReport):
-        def __create_table(
-            data: list[list],
-            style: list[tuple],
-            colWidths: list | None = None,
-            rowHeights: list | None = None,
-            spaceBefore: float | None = None,
-        ) -> Table:
-            create_style = lambda s: TableStyle(s)
-
-            return Table(
-                data,
-                colWidths,
-                rowHeights,
-                create_style(style),
-                spaceBefore=spaceBefore,
-            )
+    @classmethod
+    def __cache(cls) -> RenderCache:
+        if cls.render_cache is None:
+            cls.render_cache = RenderCache()
+        return cls.render_cache
 
-        def __create_counts_table(
-            money: MoneyCount | None, counts: Counts | None
-        ) -> Table:
-            bills = money.bills if money else {}
-            cents = money.cents if money else {}
-            gift_cards = counts.gift_cards if counts else None
-
-            return __create_table(
-                data=[
-                    ["$100", bills.get("100", 0), "¢25", cents.get("25", 0)],
-                    ["$50", bills.get("50", 0), "¢10", cents.get("10", 0)],
-                    ["$20", bills.get("20", 0), "¢5", cents.get("5", 0)],
-                    ["$10", bills.get("10", 0), "¢1", cents.get("1", 0)],
-                    ["$5", bills.get("5", 0), "Gift cards", ""],
-                    [
-                        "$2",
-                        bills.get("2", 0),
-                        50,
-                        gift_cards.fifty if gift_cards else 0,
-                    ],
-                    [
-                        "$1",
-                        bills.get("1", 0),
-                        25,
-                        gift_cards.t_five if gift_cards else 0,
-                    ],
-                    ["Littmanns", "", counts.littmanns if counts else 0, ""],
-                    ["Total", "", f"${count_money(bills, cents)}", ""],
-                ],
-                style=[
-                    ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-                    ("ALIGN", (0, -2), (1, -1), "RIGHT"),
-                    ("BOX", (2, -5), (-1, -3), 0.5, colors.grey),
-                    ("FONTNAME", (0, 0), (0, -1), "Helvetica-Bold"),
-                    ("FONTNAME", (-2, 0), (-2, -3), "Helvetica-Bold"),
-                    ("LINEABOVE", (2, -4), (-1, -4), 0.5, colors.grey),
-                    ("SPAN", (2, 4), (-1, 4)),
-                    ("SPAN", (2, -1), (-1, -1)),
-                    ("SPAN", (0, -2), (1, -2)),
-                    ("SPAN", (0, -1), (1, -1)),
-                    ("SPAN", (-2, -2), (-1, -2)),
-                    ("TEXTCOLOR", (1, 0), (1, -3), colors.grey),
-                    ("TEXTCOLOR", (3, 0), (3, -3), colors.grey),
-                    ("TEXTCOLOR", (2, -2), (2, -1), colors.grey),
-                ],
-            )
-
-        def __create_movements_table(title: str, movements: Movements | None) -> Table:
-            if movements:
-                amounts = [
-                    movements.card.amount,
-                    movements.cash.amount,
-                    movements.gift.amount,
-                ]
-                counts = [movements.card.qty, movements.cash.qty, movements.gift.qty]
-                count = movements.count
-                amount = movements.amount
-            else:
-                amounts = [0, 0, 0]
-                counts = [0, 0, 0]
-                count = 0
-                amount = 0
-            return __create_table(
-                data=[
-                    [title, "", ""],
-                    ["Cash", "Card", "Gift card"],
-                    counts,
-                    [f"${amounts[0]}", f"${amounts[1]}", f"${amounts[2]}"],
-                    [f"{count}  ◊  ${amount}", "", ""],
-                ],
-                style=[
-                    ("SPAN", (0, 0), (-1, 0)),
-                    ("SPAN", (0, -1), (-1, -1)),
-                    ("FONTNAME", (0, 0), (-1, 1), "Helvetica-Bold"),
-                    # ("FONTNAME", (0, -1), (0, -1), "Helvetica-Bold"),
-                    ("FONTSIZE", (0, 0), (-1, 0), 23),
-                    ("FONTSIZE", (0, 1), (-1, 1), 15),
-                    ("FONTSIZE", (0, -1), (-1, -1), 13),
-                    ("LINEABOVE", (0, -1), (-1, -1), 0.5, colors.grey),
-                    ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-                    ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-                    ("TEXTCOLOR", (0, 2), (-1, 2), colors.grey),
-                    ("TEXTCOLOR", (0, -1), (-1, -1), colors.grey),
-                ],
-                colWidths=[1.5 * inch],
-                rowHeights=[
-                    0.65 * inch,
-                    0.45 * inch,
-                    0.28 * inch,
-                    0.28 * inch,
-                    0.35 * inch,
-                ],
-            )
-
-        elements = []
-        file_name = f"sales_report_{sales_report.date}.pdf"
-        pdf = SimpleDocTemplate(file_name, pagesize=letter)
-
-        # Set attributes
-        pdf.title = "Daily Sales Report"
-        pdf.author = "Diego Balestra"
-        pdf.creator = "Scrubs Boutique and More"
-
-        pdf.topMargin = 5
-        pdf.bottomMargin = 5
-        pdf.leftMargin = 20
-        pdf.rightMargin = 20
-
-        ## HEADER ##
-        image = Image("assets/scrubs_logo.png", 330 / 2.5, 149 / 2.5)
-
-        title_text = """<font name=Helvetica-Bold color=black size=19>Daily Sales Report</font> <font name=Helvetica color=grey size=8>v8</font><br/>
-        <font name=Helvetica color=grey size=12>Scrubs Boutique and More LLC</font>"""
-        header = ParagraphAndImage(Paragraph(title_text), image, ypad=20)
-        elements.append(header)
-
-        ## DATA ##
-        store_name = sales_report.store.name
-        store_open, store_close = sales_report.schedule.working_hours
-        working_hours = store_close.hour - store_open.hour
-        date = sales_report.date.strftime("%B %d, %Y")
-
-        data = __create_table(
-            data=[["Store", "Hours", "Date"], [store_name, working_hours, date]],
-            style=[
-                ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-                ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-                ("FONTSIZE", (0, 0), (-1, 0), 18),
-                ("FONTSIZE", (0, 1), (-1, 1), 14),
-                ("TEXTCOLOR", (0, 0), (-1, 0), colors.black),
-                ("TEXTCOLOR", (0, 1), (-1, 1), colors.grey),
-                ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-            ],
-            colWidths=[2.5 * inch],
-            rowHeights=[0.45 * inch, 0.3 * inch],
-            spaceBefore=65,
-        )
-        elements.append(data)
-
-        ## COUNTS ##
-        open_counts = __create_counts_table(
-            sales_report.money_open, sales_report.counts_open
-        )
-        close_counts = __create_counts_table(
-            sales_report.money_close, sales_report.counts_close
-        )
+    @staticmethod
+    def __cache_key(sales_report: SalesReport) -> str:
+        from .reports import TEMPLATE_VERSION
 
-        counts = __create_table(
-            data=[["Open Money", "Close Money"], [open_counts, close_counts]],
-            style=[
-                ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-                ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-                ("FONTSIZE", (0, 0), (-1, 0), 23),
-                ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-            ],
-            rowHeights=[0.5 * inch, 2.75 * inch],
-            spaceBefore=30,
+        return RenderCache.key(
+            {
+                "template": TEMPLATE_VERSION,
+                "report": sales_report.to_dict(),
+                "store": sales_report.store.name,
+            }
         )
-        elements.append(counts)
-
-        ## SALES ##
-        sales = __create_movements_table("Sales", sales_report.sales)
-        elements.append(sales)
-
-        ## RETURNS ##
-        returns = __create_movements_table("Returns", sales_report.returns)
-        elements.append(returns)
 
-        ## SAVE PDF ##
-        pdf.build(elements)
-
-        ## PRINT PDF ##
-        self.print_pdf(file_name)
-
-    def print_pdf(self, file_name: str):
-        import platform
-        import subprocess
-
-        if platform.system() == "Windows":
-            subprocess.run(["print", file_name], shell=True)
-        elif platform.system() == "Darwin":  # macOS
-            subprocess.run(["lp", file_name])
-        else:  # Linux or others
-            subprocess.run(["lp", file_name])
+    @timed("sales_reports.render")
+    def render(
+        self, sales_report: SalesReport, output: BinaryIO | None = None
+    ) -> bytes:
+        """Render a sales report to PDF bytes, also written to ``output`` if given.
+
+        Unchanged reports are served from the render cache without running
+        ReportLab again.
+        """
+        key = self.__cache_key(sales_report)
+        pdf = self.__cache().get(key)
+        if pdf is None:
+            from .reports import render_report
+
+            buffer = BytesIO()
+            render_report(sales_report, buffer)
+            pdf = buffer.getvalue()
+            self.__cache().put(key, pdf)
+
+        if output is not None:
+            output.write(pdf)
+        return pdf
+
+    @timed("sales_reports.generate_report")
+    def generate_report(
+        self, sales_report: SalesReport, file_name: str | None = None
+    ) -> PrintJob:
+        """Render a sales report and queue it for printing.
+
+        The PDF is also saved as ``file_name`` when given, otherwise a copy
+        is printed and removed afterwards, since the cache may evict its
+        file before the job runs.
+        """
+        pdf = self.render(sales_report)
+        temporary = file_name is None
+        if file_name is None:
+            fd, file_name = tempfile.mkstemp(prefix="sales_report_", suffix=".pdf")
+            file = os.fdopen(fd, "wb")
+        else:
+            file = open(file_name, "wb")
+        with file:
+            file.write(pdf)
+        return self.print_pdf(file_name, temporary=temporary)
+
+    @timed("sales_reports.generate_reports")
+    def generate_reports(
+        self,
+        sales_reports: list[SalesReport],
+        workers: int | None = None,
+        output_dir: str = ".",
+        merge: str | None = None,
+        print_pdfs: bool = False,
+        progress: Callable[[ReportResult], None] | None = None,
+    ) -> list[ReportResult]:
+        """Render many sales reports in a pool of ``workers`` processes.
+
+        Each report gets its own file in ``output_dir``, unless ``merge``
+        names a single file to hold them all, a page each. Nothing is printed
+        unless ``print_pdfs`` is set. ``progress`` receives every result as
+        soon as it is known.
+        """
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+
+        from .reports import render_report, render_reports
+
+        results: list[ReportResult] = []
+
+        def done(result: ReportResult):
+            results.append(result)
+            if progress:
+                progress(result)
+
+        if merge:
+            # A document is laid out page after page, so a single process
+            # builds the merged file
+            try:
+                errors = render_reports(sales_reports, merge)
+            except Exception as error:
+                errors = {sales_report.id: str(error) for sales_report in sales_reports}
+            for sales_report in sales_reports:
+                error = errors.get(sales_report.id)
+                done(ReportResult(sales_report.id, None if error else merge, error))
+        else:
+            with ProcessPoolExecutor(workers) as pool:
+                futures = {
+                    pool.submit(
+                        render_report,
+                        sales_report,
+                        os.path.join(
+                            output_dir,
+                            f"sales_report_{sales_report.store.initials}"
+                            f"_{sales_report.date}.pdf",
+                        ),
+                    ): sales_report
+                    for sales_report in sales_reports
+                }
+                for future in as_completed(futures):
+                    try:
+                        done(ReportResult(futures[future].id, future.result()))
+                    except Exception as error:
+                        done(ReportResult(futures[future].id, None, str(error)))
+
+        if print_pdfs:
+            for file_name in dict.fromkeys(r.file_name for r in results if r.file_name):
+                self.print_pdf(file_name)
+        return results
+
+    @timed("sales_reports.print_pdf")
+    def print_pdf(
+        self, file_name: str, printer: str | None = None, temporary: bool = False
+    ) -> PrintJob:
+        """Queue a PDF on the print spooler without waiting for it.
+
+        A ``temporary`` file is removed once it is printed.
+        """
+        if SalesReports.spooler is None:
+            SalesReports.spooler = PrintSpooler()
+            # The worker is a daemon thread, print the queued jobs before exiting
+            atexit.register(SalesReports.spooler.close)
+        return SalesReports.spooler.submit(file_name, printer, temporary)
@@ -0,0 +1,243 @@
+import json
+import os
+import socketserver
+import threading
+from contextlib import ExitStack
+from itertools import islice
+from typing import Any
+
+from tinydb import TinyDB
+
+from .database import Database
+from .remote import parse_address
+from .shards import ShardedTable
+from .tables import ConflictError, DuplicateError
+
+# Table methods clients may call
+METHODS = {
+    "__len__",
+    "version",
+    "allocate_ids",
+    "all",
+    "get",
+    "lookup",
+    "ordered",
+    "insert",
+    "insert_multiple",
+    "update",
+    "update_many",
+    "remove",
+}
+
+
+class Session:
+    """Batch state of one client connection."""
+
+    def __init__(self):
+        self.depth = 0
+        self.batch = ExitStack()
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def __init__(self, request, client_address, server, owner: "DatabaseServer"):
+        self.owner = owner
+        super().__init__(request, client_address, server)
+
+    def handle(self):
+        session = Session()
+        try:
+            for line in self.rfile:
+                try:
+                    response = {"result": self.owner.run(json.loads(line), session)}
+                except ConflictError as error:
+                    response = {"error": str(error), "conflict": True}
+                except DuplicateError as error:
+                    response = {"error": str(error), "duplicate": True}
+                except Exception as error:
+                    response = {"error": f"{type(error).__name__}: {error}"}
+                self.wfile.write(json.dumps(response).encode() + b"\n")
+        finally:
+            # A client that disconnects mid batch must not keep the others out
+            if session.depth:
+                session.depth = 1
+                self.owner.end(session, abort=True)
+
+
+class DatabaseServer:
+    """Serves the open database to the other processes of the machine.
+
+    The server owns the only handle on the database, so its tables stay in
+    memory and no client parses the file. Requests of every client run one
+    at a time, and changes are written to disk every ``flush_interval``
+    seconds and on close instead of on each write. Clients connect with
+    ``Database.open(address, backend="remote")``, after which the
+    repositories work unchanged. A client batch keeps the other clients'
+    requests waiting until it ends, and runs in a transaction on SQLite.
+    A batch aborted by a client, or by its disconnecting, is rolled back on
+    SQLite only: TinyDB has already applied its writes, which are kept and
+    written to disk like any other.
+    """
+
+    def __init__(self, address: str, flush_interval: float = 1.0):
+        self.address = address
+        self.flush_interval = flush_interval
+        self.__lock = threading.RLock()
+        self.__stopped = threading.Event()
+        self.__thread: threading.Thread | None = None
+
+        # Clients opening the server's address in this process change the
+        # default database, so keep hold of the one being served
+        self.__database = Database()
+        if isinstance(self.__database.db, TinyDB):
+            self.__database.storage.write_through = False
+
+        def handler(*args):
+            return RequestHandler(*args, owner=self)
+
+        location = parse_address(address)
+        if isinstance(location, tuple):
+            self.__server: socketserver.BaseServer = socketserver.ThreadingTCPServer(
+                location, handler, bind_and_activate=False
+            )
+            self.__server.allow_reuse_address = True  # type: ignore
+            self.__server.server_bind()  # type: ignore
+            self.__server.server_activate()  # type: ignore
+        else:
+            if os.path.exists(location):
+                # Socket left behind by a server that did not close
+                os.remove(location)
+            self.__server = socketserver.ThreadingUnixStreamServer(location, handler)
+        self.__server.daemon_threads = True  # type: ignore
+
+    def run(self, message: dict, session: Session) -> Any:
+        """Run a client request."""
+        if message["op"] == "begin":
+            self.begin(session)
+            return None
+        if message["op"] == "end":
+            self.end(session, message.get("abort", False))
+            return None
+        if message["op"] == "flush":
+            self.flush()
+            return None
+
+        with self.__lock:
+            return self.call(
+                message["table"],
+                message["method"],
+                message.get("args", []),
+                message.get("kwargs", {}),
+                message.get("after"),
+                message.get("limit"),
+            )
+
+    def call(
+        self,
+        name: str,
+        method: str,
+        args: list,
+        kwargs: dict,
+        after: list | None = None,
+        limit: int | None = None,
+    ) -> Any:
+        if method not in METHODS:
+            raise ValueError(f"unknown table method {method}")
+        table = self.__database.table(name)
+        if isinstance(table, ShardedTable):
+            table.write_through = False
+
+        if method == "__len__":
+            return len(table)
+        if method == "version":
+            return table.version
+        if method == "update_many":
+            args = [{id: fields for id, fields in args[0]}]
+        if method == "ordered":
+            return self.__page(table, *args, after=after, limit=limit, **kwargs)
+        result = getattr(table, method)(*args, **kwargs)
+        if method == "allocate_ids":
+            return [result.start, result.stop]
+        return result
+
+    @staticmethod
+    def __page(
+        table: Any,
+        field: str,
+        low: Any = None,
+        high: Any = None,
+        after: list | None = None,
+        limit: int | None = None,
+        **fields: Any,
+    ) -> list[dict]:
+        """Retrieve a page of ``ordered``, starting after a field value and ID.
+
+        Clients page through long ranges this way, so each page reads from
+        where the last one ended, whatever was written in between.
+        """
+        if after is None:
+            return list(islice(table.ordered(field, low, high, **fields), limit))
+        value, id = after
+        docs = (
+            doc
+            for doc in table.ordered(field, value, high, **fields)
+            if doc[field] != value or doc["id"] > id
+        )
+        return list(islice(docs, limit))
+
+    def begin(self, session: Session):
+        if not session.depth:
+            self.__lock.acquire()
+            try:
+                session.batch.enter_context(self.__database.batch())
+            except BaseException:
+                self.__lock.release()
+                raise
+        session.depth += 1
+
+    def end(self, session: Session, abort: bool = False):
+        """End a client batch, rolling it back on SQLite when aborted."""
+        session.depth -= 1
+        if session.depth:
+            return
+        try:
+            if abort:
+                error = RuntimeError("batch aborted by the client")
+                session.batch.__exit__(RuntimeError, error, None)
+            else:
+                session.batch.close()
+        finally:
+            self.__lock.release()
+
+    def flush(self):
+        """Write pending changes to disk."""
+        with self.__lock:
+            self.__database.flush()
+
+    def __flush_periodically(self):
+        while not self.__stopped.wait(self.flush_interval):
+            self.flush()
+
+    def serve_forever(self):
+        """Serve requests until stopped, then write pending changes."""
+        flusher = threading.Thread(target=self.__flush_periodically, daemon=True)
+        flusher.start()
+        try:
+            self.__server.serve_forever()
+        finally:
+            self.__stopped.set()
+            self.__server.server_close()
+            self.flush()
+            if isinstance(parse_address(self.address), str):
+                os.remove(self.address)
+
+    def start(self) -> "DatabaseServer":
+        """Serve requests from a background thread."""
+        self.__thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.__thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and write pending changes."""
+        self.__server.shutdown()
+        if self.__thread is not None:
+            self.__thread.join()
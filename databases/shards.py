@@ -0,0 +1,366 @@
+import json
+import os
+from contextlib import nullcontext
+from itertools import groupby
+from typing import Any, ContextManager, Iterable, Iterator, Mapping
+
+from .metrics import Metrics
+from .storages import FileLock
+from .tables import check_version, duplicate_error
+
+
+class Shard:
+    """Documents of one store and month, as last read from or written to disk."""
+
+    __slots__ = ("path", "docs", "stamp")
+
+    def __init__(self, path: str):
+        self.path = path
+        self.docs: dict[int, dict] = {}
+        self.stamp: tuple[int, int, int] | None = None
+
+
+class ShardedTable:
+    """Table split into a JSON file per store and month, with a manifest.
+
+    Has the same interface as ``IndexedTable``. Each write rewrites only the
+    shards of the documents it changes, plus the manifest when documents are
+    added or removed, so history is never rewritten. The manifest keeps the
+    store, month, count and ID range of every shard, so ``ordered`` and
+    ``lookup`` read only the shards that can hold a match. With a ``lock``,
+    files are read holding it shared and written holding it exclusively.
+    No two documents may share the values of the ``unique`` fields, which
+    include the store and date fields, so such documents share a shard.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        name: str,
+        fields: tuple[str, str],
+        lock: FileLock | None = None,
+        unique: list[tuple[str, ...]] | None = None,
+    ):
+        self.directory = directory
+        self.name = name
+        self.__unique = unique or []
+        self.write_through = True
+        self.__lock = lock
+        self.__store, self.__date = fields
+        self.__manifest_path = os.path.join(directory, "manifest.json")
+        self.__manifest: dict[str, Any] = {"next": 1, "shards": {}}
+        self.__manifest_stamp: tuple[int, int, int] | None = None
+        self.__shards: dict[str, Shard] = {}
+        self.__dirty: set[str] = set()
+        self.__manifest_dirty = False
+        self.__generation = 0
+        self.__writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def __stamp(path: str) -> tuple[int, int, int] | None:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def __locked(self) -> ContextManager:
+        return self.__lock.exclusive() if self.__lock else nullcontext()
+
+    def __read(self, path: str) -> Any:
+        with self.__lock.shared() if self.__lock else nullcontext():
+            with open(path, "rb") as file:
+                raw = file.read()
+        if Metrics.enabled:
+            Metrics.count("file.reads")
+            Metrics.count("file.bytes_read", len(raw))
+        return json.loads(raw)
+
+    def __write(self, path: str, data: Any) -> tuple[int, int, int] | None:
+        # Replace the file whole, so readers never see a partial shard
+        raw = json.dumps(data).encode()
+        with open(f"{path}.tmp", "wb") as file:
+            file.write(raw)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(f"{path}.tmp", path)
+        if Metrics.enabled:
+            Metrics.count("file.writes")
+            Metrics.count("file.bytes_written", len(raw))
+        return self.__stamp(path)
+
+    def __sync(self):
+        """Reload the manifest if another process changed it."""
+        if self.__manifest_dirty:
+            return
+        stamp = self.__stamp(self.__manifest_path)
+        if stamp == self.__manifest_stamp:
+            return
+        if stamp is not None:
+            self.__manifest = self.__read(self.__manifest_path)
+        self.__manifest_stamp = stamp
+        self.__generation += 1
+
+    def __key(self, doc: Mapping) -> str:
+        return f"{doc[self.__store]}-{doc[self.__date][:7]}"
+
+    def __shard(self, key: str) -> Shard:
+        shard = self.__shards.get(key)
+        if shard is None:
+            path = os.path.join(self.directory, f"{key}.json")
+            shard = self.__shards[key] = Shard(path)
+        if key in self.__dirty:
+            return shard
+
+        stamp = self.__stamp(shard.path)
+        if stamp != shard.stamp:
+            docs = self.__read(shard.path) if stamp else []
+            shard.docs = {doc["id"]: doc for doc in docs}
+            shard.stamp = stamp
+        return shard
+
+    def __keys(
+        self,
+        store: Any = None,
+        low: str | None = None,
+        high: str | None = None,
+        id: int | None = None,
+    ) -> list[str]:
+        """Retrieve the keys of the shards that can hold matching documents."""
+        self.__sync()
+        keys = []
+        for key, shard in self.__manifest["shards"].items():
+            if store is not None and shard["store"] != store:
+                continue
+            if low is not None and shard["month"] < low[:7]:
+                continue
+            if high is not None and shard["month"] > high[:7]:
+                continue
+            if id is not None and not shard["low"] <= id <= shard["high"]:
+                continue
+            keys.append(key)
+        return sorted(keys, key=lambda key: self.__manifest["shards"][key]["month"])
+
+    def __docs(self, keys: list[str]) -> list[dict]:
+        docs = [doc for key in keys for doc in self.__shard(key).docs.values()]
+        if Metrics.enabled:
+            full = len(keys) == len(self.__manifest["shards"]) > 1
+            Metrics.scanned(self.name, len(docs), full)
+        return docs
+
+    def __len__(self) -> int:
+        self.__sync()
+        return sum(shard["count"] for shard in self.__manifest["shards"].values())
+
+    @property
+    def version(self) -> tuple[int, int]:
+        """Changes whenever the table is written, here or by another process."""
+        self.__sync()
+        return self.__generation, self.__writes
+
+    def allocate_ids(self, count: int = 1) -> range:
+        """Reserve a block of consecutive IDs for new documents."""
+        with self.__locked():
+            self.__sync()
+            start = self.__manifest["next"]
+            self.__manifest["next"] = start + count
+            self.__manifest_dirty = True
+            self.__changed()
+        return range(start, start + count)
+
+    def all(self) -> list[dict]:
+        docs = self.__docs(self.__keys())
+        return sorted((dict(doc) for doc in docs), key=lambda doc: doc["id"])
+
+    def get(self, id: int) -> dict | None:
+        for key in self.__keys(id=id):
+            if doc := self.__shard(key).docs.get(id):
+                return dict(doc)
+        return None
+
+    def lookup(self, **fields: Any) -> dict | None:
+        """Retrieve the document matching every given field."""
+        if fields.keys() == {"id"}:
+            return self.get(fields["id"])
+
+        date = fields.get(self.__date)
+        keys = self.__keys(fields.get(self.__store), date, date)
+        for doc in self.__docs(keys):
+            if all(doc.get(name) == value for name, value in fields.items()):
+                return dict(doc)
+        return None
+
+    def ordered(
+        self, field: str, low: Any = None, high: Any = None, **fields: Any
+    ) -> Iterator[dict]:
+        """Iterate the documents matching ``fields`` in order of ``field``.
+
+        Only documents whose ``field`` lies between ``low`` and ``high``
+        (both inclusive) are yielded, ties are ordered by ``id``. Ordering by
+        date reads the shards a month at a time.
+        """
+        by_date = field == self.__date
+        keys = self.__keys(
+            fields.get(self.__store),
+            low if by_date else None,
+            high if by_date else None,
+        )
+        if by_date:
+            shards = self.__manifest["shards"]
+            months = [
+                list(group)
+                for _, group in groupby(keys, key=lambda key: shards[key]["month"])
+            ]
+        else:
+            months = [keys]
+
+        for month in months:
+            docs = [
+                doc
+                for doc in self.__docs(month)
+                if doc.get(field) is not None
+                and (low is None or doc[field] >= low)
+                and (high is None or doc[field] <= high)
+                and all(doc.get(name) == value for name, value in fields.items())
+            ]
+            docs.sort(key=lambda doc: (doc[field], doc["id"]))
+            for doc in docs:
+                yield dict(doc)
+
+    def insert(self, doc: Mapping) -> int:
+        self.insert_multiple([doc])
+        return doc["id"]
+
+    def __check_unique(self, docs: list[Mapping]):
+        """Raise ``DuplicateError`` if a document takes another's unique fields."""
+        if not self.__unique:
+            return
+        taken: dict[str, dict[tuple, int]] = {}
+        for doc in docs:
+            key = self.__key(doc)
+            if key not in taken:
+                taken[key] = {
+                    (fields, *(other.get(field) for field in fields)): id
+                    for id, other in self.__shard(key).docs.items()
+                    for fields in self.__unique
+                }
+            for fields in self.__unique:
+                values = (fields, *(doc.get(field) for field in fields))
+                if taken[key].setdefault(values, doc["id"]) != doc["id"]:
+                    raise duplicate_error(self.name, fields)
+
+    def insert_multiple(self, docs: Iterable[Mapping]) -> list[int]:
+        docs = list(docs)
+        with self.__locked():
+            self.__sync()
+            self.__check_unique(docs)
+            ids = []
+            for doc in docs:
+                self.__add(dict(doc))
+                ids.append(doc["id"])
+            if ids:
+                self.__manifest["next"] = max(self.__manifest["next"], max(ids) + 1)
+                self.__changed()
+        return ids
+
+    def update(self, id: int, fields: Mapping, version: int | None = None) -> bool:
+        with self.__locked():
+            doc = self.get(id)
+            if doc is None:
+                return False
+
+            new = {**doc, **fields, "version": check_version(self.name, doc, version)}
+            self.__check_unique([new])
+            if self.__key(new) != self.__key(doc):
+                # A new store or month moves the document to another shard
+                self.__discard(doc)
+                self.__add(new)
+            else:
+                key = self.__key(doc)
+                self.__shard(key).docs[id] = new
+                self.__dirty.add(key)
+            self.__changed()
+        return True
+
+    def update_many(self, changes: Mapping[int, Mapping]) -> int:
+        """Update several documents by ID, writing each shard once.
+
+        Returns how many of them were found.
+        """
+        with self.__locked():
+            write_through = self.write_through
+            self.write_through = False
+            try:
+                updated = sum(self.update(id, fields) for id, fields in changes.items())
+            finally:
+                self.write_through = write_through
+            if write_through:
+                self.flush()
+        return updated
+
+    def remove(self, id: int) -> bool:
+        with self.__locked():
+            doc = self.get(id)
+            if doc is None:
+                return False
+
+            self.__discard(doc)
+            self.__changed()
+        return True
+
+    def __add(self, doc: dict):
+        key = self.__key(doc)
+        shard = self.__shard(key)
+        entry = self.__manifest["shards"].setdefault(
+            key,
+            {
+                "store": doc[self.__store],
+                "month": doc[self.__date][:7],
+                "count": 0,
+                "low": doc["id"],
+                "high": doc["id"],
+            },
+        )
+        if doc["id"] not in shard.docs:
+            entry["count"] += 1
+        entry["low"] = min(entry["low"], doc["id"])
+        entry["high"] = max(entry["high"], doc["id"])
+        shard.docs[doc["id"]] = doc
+        self.__dirty.add(key)
+        self.__manifest_dirty = True
+
+    def __discard(self, doc: dict):
+        key = self.__key(doc)
+        del self.__shard(key).docs[doc["id"]]
+        self.__manifest["shards"][key]["count"] -= 1
+        self.__dirty.add(key)
+        self.__manifest_dirty = True
+
+    def __changed(self):
+        self.__writes += 1
+        if self.write_through:
+            self.flush()
+
+    def flush(self):
+        """Write the changed shards, then the manifest if it changed."""
+        if not self.__dirty and not self.__manifest_dirty:
+            return
+        with self.__locked():
+            for key in sorted(self.__dirty):
+                shard = self.__shards[key]
+                if shard.docs:
+                    shard.stamp = self.__write(shard.path, list(shard.docs.values()))
+                else:
+                    # The last document of the shard was removed
+                    if os.path.exists(shard.path):
+                        os.remove(shard.path)
+                    shard.stamp = None
+                    self.__manifest["shards"].pop(key, None)
+            self.__dirty.clear()
+
+            if self.__manifest_dirty:
+                self.__manifest_stamp = self.__write(
+                    self.__manifest_path, self.__manifest
+                )
+                self.__manifest_dirty = False
@@ -0,0 +1,309 @@
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Iterable, Iterator, Mapping
+
+from .metrics import Metrics
+from .tables import (
+    INDEXES,
+    ORDERED_INDEXES,
+    DuplicateError,
+    check_version,
+    duplicate_error,
+)
+
+# Documents are never nested in themselves, and are stored without spaces
+ENCODER = json.JSONEncoder(check_circular=False, separators=(",", ":"))
+
+
+class SQLiteTable:
+    """Table stored in SQLite, with the same interface as ``IndexedTable``.
+
+    Documents are kept whole in a JSON ``doc`` column, and the fields covered
+    by the table's indexes are copied into their own indexed columns so
+    lookups run as SQL queries. The ``unique`` indexes are enforced by
+    SQLite, and a write breaking one raises ``DuplicateError``.
+    """
+
+    def __init__(
+        self,
+        database: "SQLiteDatabase",
+        name: str,
+        unique: list[tuple[str, ...]],
+        ordered: list[tuple[str, ...]],
+    ):
+        self.__database = database
+        self.name = name
+        self.__writes = 0
+        fields = {field for index in unique + ordered for field in index}
+        self.__columns = sorted(fields - {"id"})
+
+        columns = "".join(f', "{column}"' for column in self.__columns)
+        database.execute(
+            f'CREATE TABLE IF NOT EXISTS "{name}" '
+            f"(id INTEGER PRIMARY KEY{columns}, doc TEXT NOT NULL)"
+        )
+        # Whether each index already created is unique, by name
+        flags = {
+            row[1]: row[2] for row in database.execute(f'PRAGMA index_list("{name}")')
+        }
+        for index in unique:
+            if index == ("id",):
+                continue
+            index_name = f'{name}_{"_".join(index)}'
+            if flags.get(index_name) == 0:
+                # Created by a version that did not enforce the index
+                database.execute(f'DROP INDEX "{index_name}"')
+            database.execute(
+                f'CREATE UNIQUE INDEX IF NOT EXISTS "{index_name}" '
+                f'ON "{name}" ({", ".join(index)})'
+            )
+        for index in ordered:
+            if index not in unique:
+                database.execute(
+                    f'CREATE INDEX IF NOT EXISTS "{name}_{"_".join(index)}" '
+                    f'ON "{name}" ({", ".join(index)})'
+                )
+
+    def __len__(self) -> int:
+        count = self.__database.execute(f'SELECT COUNT(*) FROM "{self.name}"')
+        return count.fetchone()[0]
+
+    @property
+    def version(self) -> tuple[int, int]:
+        """Changes whenever the table is written, here or by another process."""
+        return self.__database.data_version, self.__writes
+
+    def __duplicate(self, error: sqlite3.IntegrityError) -> DuplicateError:
+        # "UNIQUE constraint failed: <table>.<field>, <table>.<field>"
+        _, _, columns = str(error).partition(": ")
+        return duplicate_error(
+            self.name, [column.split(".")[-1] for column in columns.split(", ")]
+        )
+
+    def __column(self, field: str) -> str:
+        if field == "id" or field in self.__columns:
+            return f'"{field}"'
+        return f"json_extract(doc, '$.{field}')"
+
+    def __values(self, doc: Mapping) -> tuple:
+        return (
+            doc["id"],
+            *(doc.get(column) for column in self.__columns),
+            ENCODER.encode(doc),
+        )
+
+    def allocate_ids(self, count: int = 1) -> range:
+        """Reserve a block of consecutive IDs for new documents."""
+        with self.__database.transaction():
+            counter = self.__database.execute(
+                "SELECT next FROM _meta WHERE sequence = ?", (self.name,)
+            ).fetchone()
+            if counter is None:
+                start = self.__database.execute(
+                    f'SELECT COALESCE(MAX(id), 0) + 1 FROM "{self.name}"'
+                ).fetchone()[0]
+                self.__database.execute(
+                    "INSERT INTO _meta (sequence, next) VALUES (?, ?)",
+                    (self.name, start + count),
+                )
+            else:
+                start = counter[0]
+                self.__database.execute(
+                    "UPDATE _meta SET next = ? WHERE sequence = ?",
+                    (start + count, self.name),
+                )
+        return range(start, start + count)
+
+    def all(self) -> list[dict]:
+        docs = [
+            json.loads(doc)
+            for (doc,) in self.__database.execute(
+                f'SELECT doc FROM "{self.name}" ORDER BY id'
+            )
+        ]
+        if Metrics.enabled:
+            Metrics.scanned(self.name, len(docs), full=True)
+        return docs
+
+    def get(self, id: int) -> dict | None:
+        return self.lookup(id=id)
+
+    def lookup(self, **fields: Any) -> dict | None:
+        """Retrieve the document matching every given field."""
+        where = " AND ".join(f"{self.__column(field)} = ?" for field in fields)
+        row = self.__database.execute(
+            f'SELECT doc FROM "{self.name}" WHERE {where} LIMIT 1',
+            tuple(fields.values()),
+        ).fetchone()
+        if Metrics.enabled:
+            # Fields without a column are read from every document
+            full = not all(field == "id" or field in self.__columns for field in fields)
+            Metrics.scanned(self.name, len(self) if full else 1, full)
+        return json.loads(row[0]) if row else None
+
+    def ordered(
+        self, field: str, low: Any = None, high: Any = None, **fields: Any
+    ) -> Iterator[dict]:
+        """Iterate the documents matching ``fields`` in order of ``field``.
+
+        Only documents whose ``field`` lies between ``low`` and ``high``
+        (both inclusive) are yielded, ties are ordered by ``id``.
+        """
+        conditions = [f"{self.__column(name)} = ?" for name in fields]
+        params = list(fields.values())
+        if low is not None:
+            conditions.append(f"{self.__column(field)} >= ?")
+            params.append(low)
+        if high is not None:
+            conditions.append(f"{self.__column(field)} <= ?")
+            params.append(high)
+
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+        rows = self.__database.execute(
+            f'SELECT doc FROM "{self.name}" {where}'
+            f"ORDER BY {self.__column(field)}, id",
+            tuple(params),
+        )
+        scanned = 0
+        try:
+            for (doc,) in rows:
+                scanned += 1
+                yield json.loads(doc)
+        finally:
+            if Metrics.enabled:
+                Metrics.scanned(self.name, scanned)
+
+    def insert(self, doc: Mapping) -> int:
+        self.insert_multiple([doc])
+        return doc["id"]
+
+    def insert_multiple(self, docs: Iterable[Mapping]) -> list[int]:
+        docs = list(docs)
+        if not docs:
+            return []
+
+        columns = "".join(f', "{column}"' for column in self.__columns)
+        values = ", ".join("?" * (len(self.__columns) + 2))
+        with self.__database.transaction():
+            try:
+                self.__database.executemany(
+                    f'INSERT INTO "{self.name}" (id{columns}, doc) VALUES ({values})',
+                    [self.__values(doc) for doc in docs],
+                )
+            except sqlite3.IntegrityError as error:
+                raise self.__duplicate(error) from None
+            self.__writes += 1
+            last_id = max(doc["id"] for doc in docs)
+            self.__database.execute(
+                "UPDATE _meta SET next = ? WHERE sequence = ? AND next <= ?",
+                (last_id + 1, self.name, last_id),
+            )
+        return [doc["id"] for doc in docs]
+
+    def update(self, id: int, fields: Mapping, version: int | None = None) -> bool:
+        with self.__database.transaction():
+            doc = self.get(id)
+            if doc is None:
+                return False
+
+            doc.update(fields, version=check_version(self.name, doc, version))
+            assignments = "".join(f', "{column}" = ?' for column in self.__columns)
+            id, *values = self.__values(doc)
+            try:
+                self.__database.execute(
+                    f'UPDATE "{self.name}" '
+                    f"SET id = ?{assignments}, doc = ? WHERE id = ?",
+                    (id, *values, id),
+                )
+            except sqlite3.IntegrityError as error:
+                raise self.__duplicate(error) from None
+            self.__writes += 1
+        return True
+
+    def update_many(self, changes: Mapping[int, Mapping]) -> int:
+        """Update several documents by ID in a single transaction.
+
+        Returns how many of them were found.
+        """
+        with self.__database.transaction():
+            return sum(self.update(id, fields) for id, fields in changes.items())
+
+    def remove(self, id: int) -> bool:
+        cursor = self.__database.execute(
+            f'DELETE FROM "{self.name}" WHERE id = ?', (id,)
+        )
+        self.__writes += 1
+        return cursor.rowcount > 0
+
+
+class SQLiteDatabase:
+    """Connection to a SQLite database holding the repository tables."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.__connection = sqlite3.connect(
+            path, isolation_level=None, check_same_thread=False
+        )
+        self.__connection.execute("PRAGMA journal_mode=WAL")
+        self.__lock = threading.RLock()
+        self.__depth = 0
+        self.__tables: dict[str, SQLiteTable] = {}
+        self.execute(
+            "CREATE TABLE IF NOT EXISTS _meta "
+            "(sequence TEXT PRIMARY KEY, next INTEGER NOT NULL)"
+        )
+
+    def execute(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        with self.__lock:
+            return self.__connection.execute(sql, params)
+
+    def executemany(self, sql: str, params: list[tuple]) -> sqlite3.Cursor:
+        with self.__lock:
+            return self.__connection.executemany(sql, params)
+
+    @property
+    def data_version(self) -> int:
+        """Counter SQLite bumps when another connection commits."""
+        return self.execute("PRAGMA data_version").fetchone()[0]
+
+    @contextmanager
+    def transaction(self) -> Iterator["SQLiteDatabase"]:
+        """Run the enclosed statements in one transaction."""
+        with self.__lock:
+            if self.__depth:
+                self.__depth += 1
+                try:
+                    yield self
+                finally:
+                    self.__depth -= 1
+                return
+
+            self.__connection.execute("BEGIN IMMEDIATE")
+            self.__depth = 1
+            try:
+                yield self
+            except BaseException:
+                self.__connection.execute("ROLLBACK")
+                raise
+            else:
+                self.__connection.execute("COMMIT")
+            finally:
+                self.__depth = 0
+
+    def table(self, name: str) -> SQLiteTable:
+        if name not in self.__tables:
+            self.__tables[name] = SQLiteTable(
+                self, name, INDEXES.get(name, [("id",)]), ORDERED_INDEXES.get(name, [])
+            )
+        return self.__tables[name]
+
+    def tables(self) -> set[str]:
+        rows = self.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name != '_meta'"
+        )
+        return {name for (name,) in rows}
+
+    def close(self):
+        self.__connection.close()
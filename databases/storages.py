@@ -0,0 +1,554 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import IO, Any, Callable, Iterator
+
+from tinydb.storages import JSONStorage, Storage, touch
+
+from .metrics import Metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None  # type: ignore
+    import msvcrt
+
+SHARED = 1
+EXCLUSIVE = 2
+
+
+class FileLock:
+    """Lock shared by readers and exclusive to a writer, across processes.
+
+    Holds ``flock`` on ``<path>.lock``, or on Windows ``msvcrt.locking``,
+    which has no shared mode, so there readers take turns too. Holds nest,
+    and the threads of a process take turns holding it, so readers only run
+    side by side across processes. Waiting longer than ``timeout`` seconds raises
+    ``TimeoutError``, ``None`` waits forever.
+    """
+
+    def __init__(self, path: str, timeout: float | None = 10.0):
+        self.path = path
+        self.timeout = timeout
+        self.__thread_lock = threading.RLock()
+        self.__modes: list[int] = []
+        self.__file: IO[bytes] | None = None
+        self.__pid: int | None = None
+        self.__locked = False
+
+    def __timed_out(self) -> TimeoutError:
+        return TimeoutError(f"Timed out waiting for the lock on {self.path}.")
+
+    def __try_lock(self, fileno: int, mode: int) -> bool:
+        """Take the lock in the mode if it is free, returning whether it was."""
+        if fcntl is not None:
+            operation = fcntl.LOCK_SH if mode == SHARED else fcntl.LOCK_EX
+            try:
+                fcntl.flock(fileno, operation | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            return True
+
+        # Already held in the only mode there is
+        if self.__locked:
+            return True
+        os.lseek(fileno, 0, os.SEEK_SET)
+        try:
+            msvcrt.locking(fileno, msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return False
+        self.__locked = True
+        return True
+
+    def __unlock(self, fileno: int):
+        if fcntl is not None:
+            fcntl.flock(fileno, fcntl.LOCK_UN)
+        elif self.__locked:
+            os.lseek(fileno, 0, os.SEEK_SET)
+            msvcrt.locking(fileno, msvcrt.LK_UNLCK, 1)
+            self.__locked = False
+
+    def __flock(self, mode: int | None):
+        if self.__pid != os.getpid():
+            # A forked process must not share the parent's lock
+            self.__file = open(self.path, "ab")
+            self.__pid = os.getpid()
+            self.__locked = False
+        fileno = self.__file.fileno()  # type: ignore
+        if mode is None:
+            self.__unlock(fileno)
+            return
+
+        if self.__try_lock(fileno, mode):
+            return
+        if Metrics.enabled:
+            Metrics.count("lock.waits")
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while not self.__try_lock(fileno, mode):
+            if deadline is not None and time.monotonic() >= deadline:
+                raise self.__timed_out()
+            time.sleep(0.005)
+
+    @contextmanager
+    def __hold(self, mode: int) -> Iterator[None]:
+        if not self.__thread_lock.acquire(
+            timeout=-1 if self.timeout is None else self.timeout
+        ):
+            raise self.__timed_out()
+        try:
+            held = max(self.__modes, default=None)
+            if held is None or mode > held:
+                self.__flock(mode)
+            self.__modes.append(mode)
+            try:
+                yield
+            finally:
+                self.__modes.pop()
+                if not self.__modes:
+                    self.__flock(None)
+                elif mode > max(self.__modes):
+                    self.__flock(max(self.__modes))
+        finally:
+            self.__thread_lock.release()
+
+    def shared(self):
+        """Hold the lock while reading."""
+        return self.__hold(SHARED)
+
+    def exclusive(self):
+        """Hold the lock while writing, or reading to write back."""
+        return self.__hold(EXCLUSIVE)
+
+
+class CachedJSONStorage(JSONStorage):
+    """JSON storage that only parses the file again when it changed on disk."""
+
+    def __init__(
+        self,
+        path: str,
+        write_through: bool = True,
+        on_reload: Callable[[], None] | None = None,
+        **kwargs,
+    ):
+        super().__init__(path, **kwargs)
+        self.path = path
+        self.write_through = write_through
+        self.lock = FileLock(f"{path}.lock")
+        self.generation = 0
+        self.__on_reload = on_reload
+        self.__data: dict[str, dict[str, Any]] | None = None
+        self.__stamp: tuple[int, int, int] | None = None
+        self.__dirty = False
+
+    def __file_stamp(self) -> tuple[int, int, int]:
+        stat = os.stat(self.path)
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def read(self) -> dict[str, dict[str, Any]] | None:
+        # Only lock to read the file again, not to find that it is unchanged
+        if self.__dirty or self.__file_stamp() == self.__stamp:
+            return self.__data
+
+        with self.lock.shared():
+            stamp = self.__file_stamp()
+            if stamp == self.__stamp:
+                return self.__data
+            if self.__stamp and stamp[0] != self.__stamp[0]:
+                # The file was replaced, so the open handle points to the old one
+                self._handle.close()
+                self._handle = open(self.path, mode=self._mode)
+            self.__data = super().read()
+            self.__stamp = stamp
+        if Metrics.enabled:
+            Metrics.count("file.reads")
+            Metrics.count("file.bytes_read", stamp[2])
+        self.generation += 1
+        if self.__on_reload:
+            self.__on_reload()
+        return self.__data
+
+    def write(self, data: dict[str, dict[str, Any]]) -> None:
+        self.__data = data
+        self.__dirty = True
+        if self.write_through:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write pending changes to disk."""
+        if not self.__dirty:
+            return
+        with self.lock.exclusive():
+            super().write(self.__data)  # type: ignore
+            self.__stamp = self.__file_stamp()
+        self.__dirty = False
+        if Metrics.enabled:
+            Metrics.count("file.writes")
+            Metrics.count("file.bytes_written", self.__stamp[2])
+
+    def close(self) -> None:
+        self.flush()
+        super().close()
+
+
+class _Document(dict):
+    """Document that records in-place changes for its storage."""
+
+    __slots__ = ("_changes", "_key")
+
+    def __init__(self, data: dict, changes: set, key: tuple[str, str]):
+        super().__init__(data)
+        self._changes = changes
+        self._key = key
+
+    def __changed(self):
+        self._changes.add(self._key)
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.__changed()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.__changed()
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self.__changed()
+
+    def pop(self, *args):
+        self.__changed()
+        return super().pop(*args)
+
+    def popitem(self):
+        self.__changed()
+        return super().popitem()
+
+    def setdefault(self, key, default=None):
+        self.__changed()
+        return super().setdefault(key, default)
+
+    def clear(self):
+        super().clear()
+        self.__changed()
+
+
+class JournalStorage(Storage):
+    """Snapshot file plus an append-only journal of document changes.
+
+    Each write appends only the documents that changed since the previous
+    write to ``<path>.journal``. The journal is replayed over the snapshot
+    on startup, and folded into a new snapshot in a background thread once
+    it grows past ``max_journal_size`` bytes or ``max_journal_age`` seconds.
+    A record torn by a crashed process is cut off before the next one is
+    appended, and a record that still fails to parse is skipped on replay.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        write_through: bool = True,
+        on_reload: Callable[[], None] | None = None,
+        max_journal_size: int = 1 << 20,
+        max_journal_age: float = 3600.0,
+        create_dirs: bool = False,
+        **kwargs,
+    ):
+        super().__init__()
+        self.path = path
+        self.journal_path = f"{path}.journal"
+        self.write_through = write_through
+        self.max_journal_size = max_journal_size
+        self.max_journal_age = max_journal_age
+        self.generation = 0
+        self.kwargs = kwargs
+        self.__on_reload = on_reload
+        self.lock = FileLock(f"{path}.lock")
+        # Taken inside ``lock``, never around it
+        self.__lock = threading.RLock()
+        self.__compacting = threading.Lock()
+        self.__changes: set[tuple[str, str]] = set()
+        self.__tables: dict[str, dict] = {}
+        self.__pending: list[bytes] = []
+        self.__compaction: threading.Thread | None = None
+        self.__journal_since: float | None = None
+
+        touch(path, create_dirs=create_dirs)
+        touch(self.journal_path, create_dirs=create_dirs)
+        with self.lock.exclusive():
+            self.__load()
+
+            self.__drop_torn_tail()
+        self.__journal = open(self.journal_path, "ab")
+
+    def __load(self):
+        with open(self.path, "rb") as snapshot:
+            raw = snapshot.read()
+        if Metrics.enabled:
+            Metrics.count("file.reads")
+            Metrics.count("file.bytes_read", len(raw))
+        self.__snapshot_stamp = self.__stamp(self.path)
+        self.__data: dict[str, dict[str, Any]] | None = (
+            json.loads(raw) if raw.strip() else None
+        )
+        if self.__data is not None:
+            for name, table in self.__data.items():
+                for key, doc in table.items():
+                    table[key] = _Document(doc, self.__changes, (name, key))
+        self.__offset = 0
+        self.__replay()
+        self.__tables = dict(self.__data or {})
+        self.__journal_since = time.monotonic() if self.__offset else None
+
+    @staticmethod
+    def __stamp(path: str) -> tuple[int, int, int]:
+        stat = os.stat(path)
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def __replay(self) -> bool:
+        """Apply the complete journal records after the current offset."""
+        replayed = False
+        start = self.__offset
+        with open(self.journal_path, "rb") as journal:
+            journal.seek(self.__offset)
+            for line in journal:
+                if not line.endswith(b"\n"):
+                    # Still being written, or torn by a crash
+                    break
+                self.__offset += len(line)
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                self.__apply(record)
+                replayed = True
+        if Metrics.enabled:
+            Metrics.count("file.reads")
+            Metrics.count("file.bytes_read", self.__offset - start)
+        return replayed
+
+    def __drop_torn_tail(self):
+        """Cut off the bytes after the last complete record of the journal.
+
+        A process that crashed while appending leaves a record without its
+        newline, which the next record appended would be joined to.
+        """
+        with open(self.journal_path, "rb+") as journal:
+            end = position = journal.seek(0, os.SEEK_END)
+            while position > 0:
+                start = max(position - 65536, 0)
+                journal.seek(start)
+                newline = journal.read(position - start).rfind(b"\n")
+                if newline >= 0:
+                    position = start + newline + 1
+                    break
+                position = start
+            if position < end:
+                journal.truncate(position)
+
+    def __apply(self, record: dict):
+        if self.__data is None:
+            self.__data = {}
+        name = record["t"]
+        if "id" not in record:
+            self.__data.pop(name, None)
+            return
+
+        # Tables are replaced rather than changed in place, like TinyDB does
+        table = self.__data[name] = dict(self.__data.get(name, {}))
+        key = record["id"]
+        if "doc" in record:
+            table[key] = _Document(record["doc"], self.__changes, (name, key))
+        else:
+            table.pop(key, None)
+
+    def __changed(self) -> bool:
+        return (
+            self.__stamp(self.path) != self.__snapshot_stamp
+            or os.path.getsize(self.journal_path) > self.__offset
+        )
+
+    def __refresh(self):
+        """Pick up changes written to disk by another process."""
+        snapshot_stamp = self.__stamp(self.path)
+        if snapshot_stamp != self.__snapshot_stamp:
+            self.__journal.close()
+            self.__load()
+            self.__journal = open(self.journal_path, "ab")
+        elif os.path.getsize(self.journal_path) > self.__offset:
+            if not self.__replay():
+                return
+            self.__tables = dict(self.__data or {})
+        else:
+            return
+
+        self.generation += 1
+        if self.__on_reload:
+            self.__on_reload()
+
+    def read(self) -> dict[str, dict[str, Any]] | None:
+        # Only lock to read the files again, not to find that they are unchanged
+        with self.__lock:
+            if self.__pending or not self.__changed():
+                return self.__data
+        with self.lock.shared(), self.__lock:
+            if not self.__pending:
+                self.__refresh()
+            return self.__data
+
+    def write(self, data: dict[str, dict[str, Any]]) -> None:
+        with self.lock.exclusive(), self.__lock:
+            records = []
+            for name in self.__tables.keys() - data.keys():
+                records.append({"t": name})
+
+            for name, table in data.items():
+                known = self.__tables.get(name, {})
+                if table is known and not self.__changes:
+                    continue
+
+                for key in known.keys() - table.keys():
+                    records.append({"t": name, "id": key})
+                for key in table.keys() - known.keys():
+                    table[key] = _Document(table[key], self.__changes, (name, key))
+                    records.append({"t": name, "id": key, "doc": table[key]})
+
+            for name, key in self.__changes:
+                table = data.get(name, {})
+                if key in table and key in self.__tables.get(name, {}):
+                    records.append({"t": name, "id": key, "doc": table[key]})
+            self.__changes.clear()
+
+            self.__data = data
+            self.__tables = dict(data)
+            if records:
+                self.__pending.append(
+                    "".join(
+                        json.dumps(record, **self.kwargs) + "\n" for record in records
+                    ).encode()
+                )
+            if self.write_through:
+                self.flush()
+
+    def flush(self) -> None:
+        """Append pending changes to the journal."""
+        with self.lock.exclusive(), self.__lock:
+            if not self.__pending:
+                return
+            # Another process may have appended to the journal, or compacted
+            # it into a new file, since it was last read
+            compacted = self.__stamp(self.path) != self.__snapshot_stamp
+            if compacted:
+                self.__journal.close()
+                self.__journal = open(self.journal_path, "ab")
+            if compacted or os.path.getsize(self.journal_path) != self.__offset:
+                self.__drop_torn_tail()
+            behind = compacted or os.path.getsize(self.journal_path) != self.__offset
+
+            payload = b"".join(self.__pending)
+            self.__journal.write(payload)
+            self.__journal.flush()
+            os.fsync(self.__journal.fileno())
+            self.__pending.clear()
+            if behind:
+                # Replay the other records too, the new ones come after them
+                self.__refresh()
+            else:
+                self.__offset += len(payload)
+            if Metrics.enabled:
+                Metrics.count("file.writes")
+                Metrics.count("file.bytes_written", len(payload))
+            if self.__journal_since is None:
+                self.__journal_since = time.monotonic()
+
+            if self.__should_compact():
+                self.__compaction = threading.Thread(target=self.compact, daemon=True)
+                self.__compaction.start()
+
+    def __should_compact(self) -> bool:
+        if self.__compacting.locked():
+            return False
+        if self.__offset >= self.max_journal_size:
+            return True
+        return (
+            self.__journal_since is not None
+            and time.monotonic() - self.__journal_since >= self.max_journal_age
+        )
+
+    def compact(self) -> None:
+        """Fold the journal into a new snapshot."""
+        with self.__compacting:
+            self.__compact()
+
+    def __compact(self):
+        with self.lock.exclusive(), self.__lock:
+            self.flush()
+            self.__refresh()
+            offset = self.__offset
+            if not offset:
+                return
+            snapshot_stamp = self.__snapshot_stamp
+            # Copy the documents so they can be serialized outside the lock
+            data = {
+                name: {key: dict(doc) for key, doc in table.items()}
+                for name, table in (self.__data or {}).items()
+            }
+
+        snapshot_path = self.__temporary(self.path)
+        try:
+            with open(snapshot_path, "w") as snapshot:
+                json.dump(data, snapshot, **self.kwargs)
+                snapshot.flush()
+                os.fsync(snapshot.fileno())
+
+            with self.lock.exclusive(), self.__lock:
+                if self.__stamp(self.path) != snapshot_stamp:
+                    # Another process compacted the journal meanwhile
+                    return
+                self.flush()
+                self.__refresh()
+
+                # Records are idempotent, so a crash past this point only means
+                # replaying some of them again over the new snapshot
+                os.replace(snapshot_path, self.path)
+                self.__snapshot_stamp = self.__stamp(self.path)
+
+                with open(self.journal_path, "rb") as journal:
+                    journal.seek(offset)
+                    tail = journal.read(self.__offset - offset)
+                journal_path = self.__temporary(self.journal_path)
+                with open(journal_path, "wb") as journal:
+                    journal.write(tail)
+                    journal.flush()
+                    os.fsync(journal.fileno())
+                self.__journal.close()
+                os.replace(journal_path, self.journal_path)
+                self.__journal = open(self.journal_path, "ab")
+                self.__offset = len(tail)
+                self.__journal_since = time.monotonic() if tail else None
+                if Metrics.enabled:
+                    Metrics.count("file.writes", 2)
+                    Metrics.count(
+                        "file.bytes_written", self.__snapshot_stamp[2] + len(tail)
+                    )
+        finally:
+            if os.path.exists(snapshot_path):
+                os.remove(snapshot_path)
+
+    def __temporary(self, path: str) -> str:
+        """Create a file to replace ``path`` with, unique to this process."""
+        handle, temporary = tempfile.mkstemp(
+            prefix=f"{os.path.basename(path)}.", dir=os.path.dirname(path) or "."
+        )
+        os.close(handle)
+        shutil.copymode(path, temporary)
+        return temporary
+
+    def close(self) -> None:
+        self.flush()
+        if self.__compaction:
+            self.__compaction.join()
+        self.__journal.close()
@@ -1,56 +1,138 @@
-from tinydb import Query
+from typing import Iterable, List, Mapping
 
 from models import Store
 
+from .cache import ListingCache
 from .database import Database
+from .metrics import timed
+from .tables import ConflictError
 
 
 class Stores:
     def __init__(self):
-        self.__table = Database().db.table("stores")
+        self.__table = Database().table("stores")
+        self.__cache: ListingCache[Store] = Database().cache("stores")
 
-    @property
-    def list(self) -> list[Store]:
+    @timed("stores.hydrate")
+    def __load(self) -> list[Store]:
         return sorted(
             [Store.from_dict(sto) for sto in self.__table.all()],
             key=lambda sto: sto.name,
         )
 
+    @property
+    @timed("stores.list")
+    def list(self) -> list[Store]:
+        return self.__cache.listing(
+            self.__table.version, self.__load, lambda sto: sto.id
+        )
+
+    @property
+    def cache_stats(self) -> dict[str, int]:
+        return self.__cache.stats
+
+    @timed("stores.get")
     def get(self, id: int) -> Store | None:
-        store = self.__table.get(Query().id == id)
+        return self.__cache.get(self.__table.version, id, lambda: self.__get(id))
+
+    def __get(self, id: int) -> Store | None:
+        store = self.__table.get(id)
         if not store:
             return None
         return Store.from_dict(store)  # type: ignore
 
+    @timed("stores.add")
     def add(self, name: str, initials: str) -> str:
-        id = Database.get_next_id(self.__table)
-
-        # Check if an store already exists
-        if existing_store := Database.check_existence(
-            self.__table, name=name, initials=initials
-        ):
-            return existing_store
+        with Database().batch():
+            # Check if an store already exists
+            if existing_store := Database.check_existence(
+                self.__table, name=name, initials=initials
+            ):
+                return existing_store
 
-        # Add new store if no duplicates found
-        self.__table.insert({"id": id, "name": name, "initials": initials})
+            # Add new store if no duplicates found
+            id = Database.get_next_id(self.__table)
+            self.__table.insert({"id": id, "name": name, "initials": initials})
         return f"Store {name} added with ID {id}."
 
+    @timed("stores.add_many")
+    def add_many(self, stores: Iterable[Mapping]) -> List[str]:
+        """Add several stores with a single write, returning a message for each.
+
+        Stores without initials get them generated from their name.
+        """
+        rows = [
+            {"name": store["name"], "initials": store.get("initials")}
+            for store in stores
+        ]
+        with Database().batch():
+            messages = Database.check_existence_many(
+                self.__table, rows, ("name", "initials")
+            )
+            new = [row for row, message in zip(rows, messages) if message is None]
+            ids = Database.get_next_ids(self.__table, len(new))
+            for id, row in zip(ids, new):
+                row["id"] = id
+            self.__table.insert_multiple(new)
+        return [
+            message or f"Store {row['name']} added with ID {row['id']}."
+            for row, message in zip(rows, messages)
+        ]
+
+    @timed("stores.edit")
     def edit(
         self, store: Store, name: str | None = None, initials: str | None = None
     ) -> str:
-        if existing_store := Database.check_existence(
-            self.__table, name=name, initials=initials
-        ):
-            return existing_store
-
-        self.__table.update(
-            {"name": name or store.name, "initials": initials or store.initials},
-            Query().id == store.id,
-        )
+        with Database().batch():
+            if existing_store := Database.check_existence(
+                self.__table, name=name, initials=initials
+            ):
+                return existing_store
+
+            try:
+                self.__table.update(
+                    store.id,
+                    {
+                        "name": name or store.name,
+                        "initials": initials or store.initials,
+                    },
+                    store.version,
+                )
+            except ConflictError as error:
+                return str(error)
         return f"Store {name or store.name} updated."
 
+    @timed("stores.edit_many")
+    def edit_many(self, edits: Iterable[tuple[Store, Mapping]]) -> List[str]:
+        """Edit several stores with a single write, returning a message for each."""
+        rows = [
+            {
+                "id": store.id,
+                "name": fields.get("name") or store.name,
+                "initials": fields.get("initials") or store.initials,
+                "version": store.version,
+            }
+            for store, fields in edits
+        ]
+        with Database().batch():
+            messages = Database.check_existence_many(
+                self.__table, rows, ("name", "initials")
+            )
+            self.__table.update_many(
+                {
+                    row.pop("id"): row
+                    for row, message in zip(rows, messages)
+                    if not message
+                }
+            )
+        return [
+            message or f"Store {row['name']} updated."
+            for row, message in zip(rows, messages)
+        ]
+
+    @timed("stores.remove")
     def remove(self, store: Store) -> str:
-        if self.__table.remove(Query().id == store.id):
+        if self.__table.remove(store.id):
             return f"Store {store.name} removed."
         else:
             return f"Store not found."
@@ -0,0 +1,379 @@
+from bisect import bisect_left, insort
+from contextlib import nullcontext
+from typing import Any, ContextManager, Iterable, Iterator, Mapping
+
+from tinydb import Query
+from tinydb.table import Document, Table
+
+from .metrics import Metrics
+
+INDEXES: dict[str, list[tuple[str, ...]]] = {
+    "employees": [("id",), ("name",), ("initials",), ("color",)],
+    "stores": [("id",), ("name",), ("initials",)],
+    "sales_reports": [("id",), ("store", "date")],
+    "sales_rollups": [("id",), ("store", "period", "start")],
+}
+
+ORDERED_INDEXES: dict[str, list[tuple[str, ...]]] = {
+    "sales_reports": [("date",), ("store", "date")],
+    "sales_rollups": [("store", "period", "start")],
+}
+
+# Store and date fields of the tables that can be split per store and month
+SHARDS: dict[str, tuple[str, str]] = {
+    "sales_reports": ("store", "date"),
+    "sales_rollups": ("store", "start"),
+}
+
+# Tables split even without ``Database.sharded``, so the history they grow
+# with is not rewritten along with the main file
+ALWAYS_SHARDED = {"sales_rollups"}
+
+
+class ConflictError(Exception):
+    """A document changed since the version an update was based on."""
+
+
+class DuplicateError(Exception):
+    """A document has the same unique fields as another one of its table."""
+
+
+def check_version(name: str, doc: Mapping, version: int | None) -> int:
+    """Retrieve the next version of a document, raising if it is stale."""
+    current = doc.get("version", 0)
+    if version is not None and version != current:
+        raise ConflictError(
+            f"{name[:-1].capitalize()} {doc['id']} changed since it was read."
+        )
+    return current + 1
+
+
+def duplicate_error(name: str, fields: Iterable[str]) -> DuplicateError:
+    """Build the error of a write repeating the unique fields of a table."""
+    return DuplicateError(
+        f"{name[:-1].replace('_', ' ').capitalize()} with the same "
+        f"{' and '.join(fields)} already exists."
+    )
+
+
+class Sequences:
+    """Per-table ID counters persisted in the ``_meta`` table.
+
+    A counter is seeded once from the highest ID in its table and then only
+    moves forward, so allocating IDs never scans the table again.
+    """
+
+    def __init__(self, table: Table):
+        self.__table = table
+
+    def __counter(self, name: str) -> Document | None:
+        return self.__table.get(Query().sequence == name)  # type: ignore
+
+    def allocate(self, table: "IndexedTable", count: int = 1) -> range:
+        """Reserve a block of consecutive IDs for the table."""
+        counter = self.__counter(table.name)
+        if counter is None:
+            start = max((doc["id"] for doc in table.all()), default=0) + 1
+            self.__table.insert({"sequence": table.name, "next": start + count})
+        else:
+            start = counter["next"]
+            self.__table.update({"next": start + count}, doc_ids=[counter.doc_id])
+        return range(start, start + count)
+
+    def next(self, name: str) -> int | None:
+        """Retrieve the next ID of a table, if its counter was seeded."""
+        counter = self.__counter(name)
+        return counter["next"] if counter is not None else None
+
+    def advance(self, name: str, id: int):
+        """Move the counter past an ID inserted without allocating it."""
+        counter = self.__counter(name)
+        if counter is not None and id >= counter["next"]:
+            self.__table.update({"next": id + 1}, doc_ids=[counter.doc_id])
+
+
+class IndexedTable:
+    """TinyDB table with in-memory indexes kept in sync on writes.
+
+    Each unique index maps the values of its fields to a document ID, so
+    lookups by any indexed field (or combination of fields) don't scan the
+    table. Ordered indexes keep ``(fields..., id, doc_id)`` entries sorted to
+    serve range scans. Indexes are rebuilt whenever the storage reloads the
+    file from disk.
+
+    Writes hold the storage's exclusive lock, if it has one, from reading the
+    file to writing it back, and every update bumps the ``version`` of its
+    documents. Given the version it was based on, an update of a document
+    changed since raises ``ConflictError``.
+    """
+
+    def __init__(
+        self,
+        table: Table,
+        indexes: list[tuple[str, ...]],
+        sequences: Sequences | None = None,
+        ordered: list[tuple[str, ...]] | None = None,
+    ):
+        self.__table = table
+        self.__sequences = sequences
+        self.__indexes: dict[tuple[str, ...], dict[tuple, int]] = {
+            fields: {} for fields in indexes
+        }
+        self.__ordered: dict[tuple[str, ...], list[tuple]] = {
+            fields: [] for fields in ordered or []
+        }
+        self.__generation = -1
+        self.__writes = 0
+
+    @property
+    def name(self) -> str:
+        return self.__table.name
+
+    @property
+    def table(self) -> Table:
+        return self.__table
+
+    def __len__(self) -> int:
+        return len(self.__table)
+
+    @property
+    def version(self) -> tuple[int, int]:
+        """Changes whenever the table is written or reloaded from disk."""
+        self.__sync()
+        return self.__generation, self.__writes
+
+    def __sync(self):
+        storage = self.__table.storage
+        storage.read()
+        generation = getattr(storage, "generation", self.__generation)
+        if generation == self.__generation:
+            return
+
+        for index in self.__indexes.values():
+            index.clear()
+        for entries in self.__ordered.values():
+            entries.clear()
+        for doc in self.__table.all():
+            self.__index(doc, doc.doc_id, sort=False)
+        for entries in self.__ordered.values():
+            entries.sort()
+        self.__generation = generation
+        if Metrics.enabled:
+            Metrics.scanned(self.name, len(self.__table), full=True)
+
+    def __index(self, doc: Mapping, doc_id: int, sort: bool = True):
+        for fields, index in self.__indexes.items():
+            key = tuple(doc.get(field) for field in fields)
+            if None not in key:
+                index[key] = doc_id
+
+        for fields, entries in self.__ordered.items():
+            key = tuple(doc.get(field) for field in fields)
+            if None not in key:
+                entry = (*key, doc["id"], doc_id)
+                if sort:
+                    insort(entries, entry)
+                else:
+                    entries.append(entry)
+
+    def __unindex(self, doc: Mapping, doc_id: int):
+        for fields, index in self.__indexes.items():
+            key = tuple(doc.get(field) for field in fields)
+            if index.get(key) == doc_id:
+                del index[key]
+
+        for fields, entries in self.__ordered.items():
+            entry = (*(doc.get(field) for field in fields), doc["id"], doc_id)
+            position = bisect_left(entries, entry) if None not in entry else -1
+            if 0 <= position < len(entries) and entries[position] == entry:
+                del entries[position]
+
+    def __check_unique(self, docs: Iterable[tuple[Mapping, int | None]]):
+        """Raise ``DuplicateError`` if a document takes another's unique fields.
+
+        New documents come with no document ID, updated ones with theirs.
+        """
+        taken: dict[tuple[str, ...], dict[tuple, int]] = {
+            fields: {} for fields in self.__indexes
+        }
+        for position, (doc, doc_id) in enumerate(docs):
+            owner = -position - 1 if doc_id is None else doc_id
+            for fields, index in self.__indexes.items():
+                key = tuple(doc.get(field) for field in fields)
+                if None in key:
+                    continue
+                other = taken[fields].get(key, index.get(key))
+                if other is not None and other != owner:
+                    raise duplicate_error(self.name, fields)
+                taken[fields][key] = owner
+
+    def __locked(self) -> ContextManager:
+        lock = getattr(self.__table.storage, "lock", None)
+        return lock.exclusive() if lock else nullcontext()
+
+    def __doc_id(self, id: int) -> int | None:
+        self.__sync()
+        return self.__indexes[("id",)].get((id,))
+
+    def allocate_ids(self, count: int = 1) -> range:
+        """Reserve a block of consecutive IDs for new documents."""
+        if self.__sequences is None:
+            start = max((doc["id"] for doc in self.all()), default=0) + 1
+            return range(start, start + count)
+        with self.__locked():
+            return self.__sequences.allocate(self, count)
+
+    def all(self) -> list[Document]:
+        docs = self.__table.all()
+        if Metrics.enabled:
+            Metrics.scanned(self.name, len(docs), full=True)
+        return docs
+
+    def get(self, id: int) -> Document | None:
+        doc_id = self.__doc_id(id)
+        if doc_id is None:
+            return None
+        if Metrics.enabled:
+            Metrics.scanned(self.name, 1)
+        return self.__table.get(doc_id=doc_id)  # type: ignore
+
+    def lookup(self, **fields: Any) -> Document | None:
+        """Retrieve the document matching every given field."""
+        self.__sync()
+        for index_fields, index in self.__indexes.items():
+            if set(index_fields) == fields.keys():
+                doc_id = index.get(tuple(fields[field] for field in index_fields))
+                if doc_id is None:
+                    return None
+                if Metrics.enabled:
+                    Metrics.scanned(self.name, 1)
+                return self.__table.get(doc_id=doc_id)  # type: ignore
+
+        # No index covers these fields, fall back to a scan
+        if Metrics.enabled:
+            Metrics.scanned(self.name, len(self.__table), full=True)
+        query = Query().noop()
+        for key, value in fields.items():
+            query &= Query()[key] == value
+        return self.__table.get(query)  # type: ignore
+
+    def __ordered_index(self, field: str, fields: Iterable[str]) -> tuple[str, ...]:
+        # Prefer an index led by the equality fields, else filter while scanning
+        for index in self.__ordered:
+            if index[-1] == field and set(index[:-1]) == set(fields):
+                return index
+        return (field,)
+
+    def ordered(
+        self, field: str, low: Any = None, high: Any = None, **fields: Any
+    ) -> Iterator[Document]:
+        """Iterate the documents matching ``fields`` in order of ``field``.
+
+        Only documents whose ``field`` lies between ``low`` and ``high``
+        (both inclusive) are yielded, ties are ordered by ``id``.
+        """
+        self.__sync()
+        index = self.__ordered_index(field, fields.keys())
+        prefix = tuple(fields[name] for name in index[:-1])
+        entries = self.__ordered[index]
+        start = prefix if low is None else (*prefix, low)
+
+        scanned = 0
+        try:
+            for position in range(bisect_left(entries, start), len(entries)):
+                entry = entries[position]
+                if entry[: len(prefix)] != prefix:
+                    break
+                if high is not None and entry[len(prefix)] > high:
+                    break
+                scanned += 1
+                doc = self.__table.get(doc_id=entry[-1])
+                if doc is not None and all(
+                    doc.get(name) == value for name, value in fields.items()
+                ):
+                    yield doc  # type: ignore
+        finally:
+            if Metrics.enabled:
+                Metrics.scanned(self.name, scanned)
+
+    def insert(self, doc: Mapping) -> int:
+        with self.__locked():
+            self.__sync()
+            self.__check_unique([(doc, None)])
+            doc_id = self.__table.insert(doc)
+            self.__writes += 1
+            self.__index(doc, doc_id)
+            if self.__sequences is not None:
+                self.__sequences.advance(self.name, doc["id"])
+        return doc_id
+
+    def insert_multiple(self, docs: Iterable[Mapping]) -> list[int]:
+        docs = list(docs)
+        with self.__locked():
+            self.__sync()
+            self.__check_unique((doc, None) for doc in docs)
+            doc_ids = self.__table.insert_multiple(docs)
+            self.__writes += 1
+            for doc, doc_id in zip(docs, doc_ids):
+                self.__index(doc, doc_id, sort=False)
+            for entries in self.__ordered.values():
+                entries.sort()
+            if self.__sequences is not None and docs:
+                self.__sequences.advance(self.name, max(doc["id"] for doc in docs))
+        return doc_ids
+
+    def update(self, id: int, fields: Mapping, version: int | None = None) -> bool:
+        with self.__locked():
+            doc_id = self.__doc_id(id)
+            if doc_id is None:
+                return False
+
+            old = self.__table.get(doc_id=doc_id)
+            fields = {**fields, "version": check_version(self.name, old, version)}
+            self.__check_unique([({**old, **fields}, doc_id)])  # type: ignore
+            self.__unindex(old, doc_id)  # type: ignore
+            self.__table.update(fields, doc_ids=[doc_id])
+            self.__writes += 1
+            self.__index({**old, **fields}, doc_id)  # type: ignore
+        return True
+
+    def update_many(self, changes: Mapping[int, Mapping]) -> int:
+        """Update several documents by ID in a single table write.
+
+        Returns how many of them were found.
+        """
+        with self.__locked():
+            self.__sync()
+            olds = {}
+            for id in changes:
+                doc_id = self.__indexes[("id",)].get((id,))
+                if doc_id is not None:
+                    olds[doc_id] = self.__table.get(doc_id=doc_id)
+            if not olds:
+                return 0
+            self.__check_unique(
+                ({**old, **changes[old["id"]]}, doc_id) for doc_id, old in olds.items()
+            )
+
+            def apply(doc: dict):
+                doc.update(changes[doc["id"]])
+                doc["version"] = doc.get("version", 0) + 1
+
+            for doc_id, old in olds.items():
+                self.__unindex(old, doc_id)
+            self.__table.update(apply, doc_ids=list(olds))
+            self.__writes += 1
+            for doc_id, old in olds.items():
+                self.__index({**old, **changes[old["id"]]}, doc_id)
+        return len(olds)
+
+    def remove(self, id: int) -> bool:
+        with self.__locked():
+            doc_id = self.__doc_id(id)
+            if doc_id is None:
+                return False
+
+            self.__unindex(self.__table.get(doc_id=doc_id), doc_id)  # type: ignore
+            self.__table.remove(doc_ids=[doc_id])
+            self.__writes += 1
+        return True
@@ -22,11 +22,10 @@ def get_today_date() -> str:
 
 def count_money(bill_counts: Dict[str, int], cent_counts: Dict[str, int]) -> float:
     """Retrive the sum of money of the bills and cents given."""
-    bill_count = 0
-    for denom, count in bill_counts.items():
-        bill_count += int(denom) * count
-
-    cent_count = 0
-    for denom, count in cent_counts.items():
-        cent_count += ((int(denom) / 100) * count) if count > 0 else 0
-    return bill_count + cent_count
+    # Summed in integer cents, so the result has no float rounding error
+    bill_cents = sum(int(denom) * 100 * count for denom, count in bill_counts.items())
+    cents = sum(int(denom) * count for denom, count in cent_counts.items() if count > 0)
+    total = bill_cents + cents
+    if cents or not isinstance(total, int):
+        return total / 100
+    return total // 100
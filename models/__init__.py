@@ -1,3 +1,4 @@
 from .employee import Employee
 from .sales_report import SalesReport
+from .sales_rollup import SalesRollup
 from .store import Store
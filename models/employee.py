@@ -1,9 +1,12 @@
 class Employee:
-    def __init__(self, id: int, name: str, initials: str, color: str):
+    __slots__ = ("id", "name", "initials", "color", "version")
+
+    def __init__(self, id: int, name: str, initials: str, color: str, version: int = 0):
         self.id = id
         self.name = name
         self.initials = initials
         self.color = color
+        self.version = version
 
     def __repr__(self) -> str:
         return self.name
@@ -18,4 +21,5 @@ class Employee:
             name=data["name"],
             initials=data["initials"],
             color=data["color"],
+            version=data.get("version", 0),
         )
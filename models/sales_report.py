@@ -1,18 +1,155 @@
+from array import array
 from datetime import date as dt
 from datetime import datetime, time
-from typing import Dict, List, Optional
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Sequence, Union
 
 from .employee import Employee
 from .store import Store
 
+BILLS = ("100", "50", "20", "10", "5", "2", "1")
+CENTS = ("25", "10", "5", "1")
+DENOMINATIONS = BILLS + CENTS
+VALUES = tuple(int(denom) * 100 for denom in BILLS) + tuple(int(d) for d in CENTS)
+
+
+@lru_cache(maxsize=2048)
+def parse_time(value: str) -> time:
+    """Decode an ``HH:MM`` time, sharing one object per distinct value."""
+    try:
+        return time.fromisoformat(value)
+    except ValueError:
+        return datetime.strptime(value, "%H:%M").time()
+
+
+def parse_date(value: str) -> dt:
+    """Decode a ``YYYY-MM-DD`` date."""
+    try:
+        return dt.fromisoformat(value)
+    except ValueError:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+
 
 class MoneyCount:
+    """Count of every bill and coin, one integer slot per denomination.
+
+    ``bills`` and ``cents`` read as read-only string-keyed mappings and are
+    replaced whole by assigning a dict, and the denominations that were
+    listed are remembered so ``to_dict`` gives back the same dicts. Other
+    denominations, and counts that aren't integers, are kept as they are in
+    a dict on the side and still counted in the totals. Totals are computed
+    in integer cents.
+    """
+
+    __slots__ = ("counts", "__listed", "__extra")
+
     def __init__(self, bills: Dict[str, int], cents: Dict[str, int]):
+        self.counts = array("q", bytes(8 * len(DENOMINATIONS)))
+        self.__listed = 0
+        self.__extra: Dict[str, Dict[str, Union[int, float]]] = {}
         self.bills = bills
         self.cents = cents
 
+    def __get(self, kind: str, denominations: tuple, offset: int) -> Dict[str, int]:
+        counts = {
+            denom: self.counts[offset + slot]
+            for slot, denom in enumerate(denominations)
+            if self.__listed >> (offset + slot) & 1
+        }
+        counts.update(self.__extra.get(kind, {}))
+        return counts
+
+    def __set(
+        self, kind: str, denominations: tuple, offset: int, counts: Dict[str, int]
+    ):
+        for slot in range(offset, offset + len(denominations)):
+            self.counts[slot] = 0
+            self.__listed &= ~(1 << slot)
+        self.__extra.pop(kind, None)
+        for denom, count in counts.items():
+            if denom not in denominations or type(count) is not int:
+                self.__extra.setdefault(kind, {})[denom] = count
+                continue
+            slot = offset + denominations.index(denom)
+            self.counts[slot] = count
+            self.__listed |= 1 << slot
+
+    @property
+    def bills(self) -> Mapping[str, int]:
+        return MappingProxyType(self.__get("bills", BILLS, 0))
+
+    @bills.setter
+    def bills(self, bills: Mapping[str, int]):
+        self.__set("bills", BILLS, 0, bills)
+
+    @property
+    def cents(self) -> Mapping[str, int]:
+        return MappingProxyType(self.__get("cents", CENTS, len(BILLS)))
+
+    @cents.setter
+    def cents(self, cents: Mapping[str, int]):
+        self.__set("cents", CENTS, len(BILLS), cents)
+
+    def __extra_cents(self) -> Union[int, float]:
+        return sum(
+            int(denom) * 100 * count
+            for denom, count in self.__extra.get("bills", {}).items()
+        ) + sum(
+            int(denom) * count
+            for denom, count in self.__extra.get("cents", {}).items()
+            if count > 0
+        )
+
+    @property
+    def total_cents(self) -> Union[int, float]:
+        """Total in cents, ignoring negative coin counts like ``count_money``."""
+        total = sum(
+            value * count
+            for slot, (value, count) in enumerate(zip(VALUES, self.counts))
+            if slot < len(BILLS) or count > 0
+        )
+        return total + self.__extra_cents() if self.__extra else total
+
+    @property
+    def total(self) -> float:
+        """Total in dollars, an ``int`` when only whole bills are counted."""
+        total = self.total_cents
+        coins = any(count > 0 for count in self.counts[len(BILLS) :]) or any(
+            count > 0 for count in self.__extra.get("cents", {}).values()
+        )
+        if coins or not isinstance(total, int):
+            return total / 100
+        return total // 100
+
+    @staticmethod
+    def batch_totals(money_counts: Sequence["MoneyCount"]) -> array:
+        """Total in cents of each count, computed one denomination at a time.
+
+        Denominations kept on the side are added rounded to the cent.
+        """
+        slots = len(DENOMINATIONS)
+        counts = array("q", b"".join(money.counts.tobytes() for money in money_counts))
+        totals = [0] * len(money_counts)
+        for slot, value in enumerate(VALUES):
+            column = counts[slot::slots]
+            if slot < len(BILLS):
+                totals = [total + value * count for total, count in zip(totals, column)]
+            else:
+                totals = [
+                    total + value * count if count > 0 else total
+                    for total, count in zip(totals, column)
+                ]
+        for index, money in enumerate(money_counts):
+            if money.__extra:
+                totals[index] += round(money.__extra_cents())
+        return array("q", totals)
+
     def to_dict(self) -> dict:
-        return {"bills": self.bills, "cents": self.cents}
+        return {
+            "bills": self.__get("bills", BILLS, 0),
+            "cents": self.__get("cents", CENTS, len(BILLS)),
+        }
 
     @classmethod
     def from_dict(cls, data: dict) -> "MoneyCount":
@@ -20,6 +157,8 @@ class MoneyCount:
 
 
 class GiftCards:
+    __slots__ = ("fifty", "t_five")
+
     def __init__(self, fifty: int, t_five: int):
         self.fifty = fifty
         self.t_five = t_five
@@ -33,6 +172,8 @@ class GiftCards:
 
 
 class Counts:
+    __slots__ = ("littmanns", "gift_cards")
+
     def __init__(self, littmanns: int, gift_cards: GiftCards):
         self.littmanns = littmanns
         self.gift_cards = gift_cards
@@ -49,6 +190,8 @@ class Counts:
 
 
 class EmployeeTime:
+    __slots__ = ("employee", "time")
+
     def __init__(self, employee: Employee, time: time):
         self.employee = employee
         self.time = time
@@ -57,16 +200,25 @@ class EmployeeTime:
         return {"employee": self.employee.id, "time": self.time.strftime("%H:%M")}
 
     @classmethod
-    def from_dict(cls, data: dict) -> "EmployeeTime":
-        from databases import Employees
+    def from_dict(
+        cls, data: dict, employees: Optional[Dict[int, Employee]] = None
+    ) -> "EmployeeTime":
+        if employees is None:
+            from databases import Employees
+
+            employee = Employees().get(data["employee"])
+        else:
+            employee = employees.get(data["employee"])
 
         return cls(
-            employee=Employees().get(data["employee"]) or Employee(0, "", "", ""),
-            time=datetime.strptime(data["time"], "%H:%M").time(),
+            employee=employee or Employee(0, "", "", ""),
+            time=parse_time(data["time"]),
         )
 
 
 class Schedule:
+    __slots__ = ("arrivals", "departures")
+
     def __init__(self, arrivals: List[EmployeeTime], departures: List[EmployeeTime]):
         self.arrivals = arrivals
         self.departures = departures
@@ -91,13 +243,17 @@ class Schedule:
         }
 
     @classmethod
-    def from_dict(cls, data: dict) -> "Schedule":
-        arrivals = [EmployeeTime.from_dict(d) for d in data["arrivals"]]
-        departures = [EmployeeTime.from_dict(d) for d in data["departures"]]
+    def from_dict(
+        cls, data: dict, employees: Optional[Dict[int, Employee]] = None
+    ) -> "Schedule":
+        arrivals = [EmployeeTime.from_dict(d, employees) for d in data["arrivals"]]
+        departures = [EmployeeTime.from_dict(d, employees) for d in data["departures"]]
         return cls(arrivals=arrivals, departures=departures)
 
 
 class MType:
+    __slots__ = ("qty", "amount")
+
     def __init__(self, qty: int, amount: float):
         self.qty = qty
         self.amount = amount
@@ -111,6 +267,8 @@ class MType:
 
 
 class Movements:
+    __slots__ = ("cash", "card", "gift")
+
     def __init__(self, cash: MType, card: MType, gift: MType):
         self.cash = cash
         self.card = card
@@ -141,6 +299,27 @@ class Movements:
 
 
 class SalesReport:
+    """Daily sales report of a store.
+
+    When built with ``from_dict(lazy=True)``, ``schedule`` and
+    ``counts_close`` keep their stored dicts until they are first read.
+    """
+
+    __slots__ = (
+        "id",
+        "date",
+        "store",
+        "money_open",
+        "money_close",
+        "counts_open",
+        "returns",
+        "sales",
+        "version",
+        "__schedule",
+        "__counts_close",
+        "__employees",
+    )
+
     def __init__(
         self,
         id: int,
@@ -153,6 +332,7 @@ class SalesReport:
         counts_close: Optional[Counts] = None,
         returns: Optional[Movements] = None,
         sales: Optional[Movements] = None,
+        version: int = 0,
     ) -> None:
         self.id = id
         self.date = date
@@ -164,6 +344,8 @@ class SalesReport:
         self.counts_close = counts_close
         self.returns = returns
         self.sales = sales
+        self.version = version
+        self.__employees: Optional[Dict[int, Employee]] = None
 
     def __repr__(self) -> str:
         return self.date.strftime("%Y-%m-%d")
@@ -171,15 +353,81 @@ class SalesReport:
     def __str__(self) -> str:
         return self.date.strftime("%Y-%m-%d")
 
+    def to_dict(self) -> dict:
+        data = {
+            "id": self.id,
+            "date": self.date.strftime("%Y-%m-%d"),
+            "store": self.store.id,
+            "schedule": self.schedule.to_dict(),
+            "money_open": self.money_open.to_dict(),
+            "counts_open": self.counts_open.to_dict(),
+        }
+        if self.money_close:
+            data["money_close"] = self.money_close.to_dict()
+        if self.counts_close:
+            data["counts_close"] = self.counts_close.to_dict()
+        if self.returns:
+            data["returns"] = self.returns.to_dict()
+        if self.sales:
+            data["sales"] = self.sales.to_dict()
+        return data
+
+    @property
+    def schedule(self) -> Schedule:
+        if isinstance(self.__schedule, dict):
+            self.__schedule = Schedule.from_dict(self.__schedule, self.__employees)
+        return self.__schedule
+
+    @schedule.setter
+    def schedule(self, schedule: Union[Schedule, dict]):
+        self.__schedule = schedule
+
+    @property
+    def counts_close(self) -> Optional[Counts]:
+        if isinstance(self.__counts_close, dict):
+            self.__counts_close = Counts.from_dict(self.__counts_close)
+        return self.__counts_close
+
+    @counts_close.setter
+    def counts_close(self, counts_close: Union[Counts, dict, None]):
+        self.__counts_close = counts_close
+
     @classmethod
-    def from_dict(cls, data: dict) -> "SalesReport":
-        from databases import Stores
+    def from_dict(
+        cls,
+        data: dict,
+        stores: Optional[Dict[int, Store]] = None,
+        employees: Optional[Dict[int, Employee]] = None,
+        lazy: bool = False,
+    ) -> "SalesReport":
+        """Build a report, resolving references from the given maps if any.
+
+        With ``lazy``, ``schedule`` and ``counts_close`` are only decoded
+        when first read.
+        """
+        if stores is None:
+            from databases import Stores
+
+            store = Stores().get(data["store"])
+        else:
+            store = stores.get(data["store"])
+
+        if lazy:
+            schedule = data["schedule"]
+            counts_close = data.get("counts_close") or None
+        else:
+            schedule = Schedule.from_dict(data["schedule"], employees)
+            counts_close = (
+                Counts.from_dict(data["counts_close"])
+                if data.get("counts_close")
+                else None
+            )
 
-        return cls(
+        sales_report = cls(
             id=data["id"],
-            date=datetime.strptime(data["date"], "%Y-%m-%d").date(),
-            store=Stores().get(data["store"]) or Store(0, "", ""),
-            schedule=Schedule.from_dict(data["schedule"]),
+            date=parse_date(data["date"]),
+            store=store or Store(0, "", ""),
+            schedule=schedule,  # type: ignore
             money_open=MoneyCount.from_dict(data["money_open"]),
             counts_open=Counts.from_dict(data["counts_open"]),
             money_close=(
@@ -187,13 +435,12 @@ class SalesReport:
                 if data.get("money_close")
                 else None
             ),
-            counts_close=(
-                Counts.from_dict(data["counts_close"])
-                if data.get("counts_close")
-                else None
-            ),
+            counts_close=counts_close,  # type: ignore
             returns=(
                 Movements.from_dict(data["returns"]) if data.get("returns") else None
             ),
             sales=Movements.from_dict(data["sales"]) if data.get("sales") else None,
+            version=data.get("version", 0),
         )
+        sales_report.__employees = employees
+        return sales_report
@@ -0,0 +1,34 @@
+from datetime import date as dt
+from typing import Dict
+
+from .sales_report import parse_date
+from .store import Store
+
+
+class SalesRollup:
+    __slots__ = ("id", "store", "period", "start", "totals")
+
+    def __init__(
+        self, id: int, store: Store, period: str, start: dt, totals: Dict[str, float]
+    ):
+        self.id = id
+        self.store = store
+        self.period = period
+        self.start = start
+        self.totals = totals
+
+    def __repr__(self) -> str:
+        return f"{self.store} {self.period} {self.start.strftime('%Y-%m-%d')}"
+
+    def __str__(self) -> str:
+        return f"{self.store} {self.period} {self.start.strftime('%Y-%m-%d')}"
+
+    @classmethod
+    def from_dict(cls, data: dict, store: Store) -> "SalesRollup":
+        return cls(
+            id=data["id"],
+            store=store,
+            period=data["period"],
+            start=parse_date(data["start"]),
+            totals=data["totals"],
+        )
@@ -1,8 +1,11 @@
 class Store:
-    def __init__(self, id: int, name: str, initials: str):
+    __slots__ = ("id", "name", "initials", "version")
+
+    def __init__(self, id: int, name: str, initials: str, version: int = 0):
         self.id = id
         self.name = name
         self.initials = initials
+        self.version = version
 
     def __repr__(self) -> str:
         return self.name
@@ -12,4 +15,9 @@ class Store:
 
     @classmethod
     def from_dict(cls, data: dict) -> "Store":
-        return cls(id=data["id"], name=data["name"], initials=data["initials"])
+        return cls(
+            id=data["id"],
+            name=data["name"],
+            initials=data["initials"],
+            version=data.get("version", 0),
+        )
@@ -0,0 +1,251 @@
+"""The TinyDB and SQLite backends must give the repositories the same results."""
+
+from datetime import date as dt
+from datetime import time
+
+import pytest
+
+import databases.sales_reports
+from databases import DuplicateError, Employees, SalesReports, SalesRollups, Stores
+from databases.database import Database
+from databases.rollups import PERIODS
+from models.sales_report import (
+    Counts,
+    EmployeeTime,
+    GiftCards,
+    MoneyCount,
+    Movements,
+    MType,
+    Schedule,
+)
+
+BACKENDS = ("tinydb", "sqlite")
+
+
+@pytest.fixture
+def open_database(tmp_path, monkeypatch):
+    """Open a database in ``tmp_path`` on a backend, keeping the defaults."""
+    for attribute in ("path", "backend"):
+        monkeypatch.setattr(Database, attribute, getattr(Database, attribute))
+
+    def open_database(backend: str):
+        Database.close_all()
+        Database.open(str(tmp_path / f"database.{backend}"), backend=backend)
+
+    yield open_database
+    Database.close_all()
+
+
+def add_staff():
+    Employees().add_many(
+        [{"name": "Ann Bee", "color": "red"}, {"name": "Cid Dee", "color": "blue"}]
+    )
+    Stores().add_many([{"name": "Main Street"}, {"name": "Mall"}])
+
+
+def describe(report) -> tuple:
+    """Every stored field of a report."""
+    return (
+        report.id,
+        report.date.isoformat(),
+        report.store.id,
+        report.schedule.to_dict(),
+        report.money_open.to_dict(),
+        report.counts_open.to_dict(),
+        *(
+            part.to_dict() if part else None
+            for part in (
+                report.money_close,
+                report.counts_close,
+                report.returns,
+                report.sales,
+            )
+        ),
+    )
+
+
+def open_and_close_reports(monkeypatch, days: int) -> list[str]:
+    """Open a report per store and day, then close two days out of three."""
+    ann, cid = Employees().list
+    schedule = Schedule(
+        [EmployeeTime(ann, time(9, 0)), EmployeeTime(cid, time(11, 30))],
+        [EmployeeTime(ann, time(17, 0)), EmployeeTime(cid, time(19, 0))],
+    )
+    messages = []
+    for day in range(1, days + 1):
+        today = f"2024-01-{day:02}"
+        monkeypatch.setattr(databases.sales_reports, "get_today_date", lambda: today)
+        for store in Stores().list:
+            money = MoneyCount({"20": day, "5": store.id}, {"25": 3, "1": day})
+            counts = Counts(10 + day, GiftCards(day, store.id))
+            messages.append(SalesReports().open(store, schedule, money, counts))
+        messages.append(SalesReports().open(store, schedule, money, counts))
+
+    for report in SalesReports().sales_report_list:
+        if report.date.day % 3 == 0:
+            continue
+        day, store = report.date.day, report.store.id
+        money = MoneyCount({"100": store, "1": day}, {"10": day})
+        counts = Counts(day, GiftCards(store, 2))
+        returns = Movements(MType(0, 0.0), MType(1, 5.05), MType(0, 0.0))
+        sales = Movements(MType(day, day * 10.15), MType(store, 24.99), MType(1, 0.1))
+        messages.append(SalesReports().close(report, money, counts, returns, sales))
+        if day == 1:
+            messages.append(SalesReports().close(report, money, counts, returns, sales))
+    return messages
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_employees(open_database, backend):
+    open_database(backend)
+    employees = Employees()
+
+    assert employees.add("Ann Bee", "AB", "red") == "Employee Ann Bee added with ID 1."
+    assert (
+        employees.add("Ann Bee", "AB", "red")
+        == "Employee with name Ann Bee already exists."
+    )
+    assert employees.add_many(
+        [
+            {"name": "Cid Dee", "color": "blue"},
+            {"name": "Eve Fox", "initials": "EF", "color": "green"},
+            {"name": "Ann Bee", "color": "pink"},
+        ]
+    ) == [
+        "Employee Cid Dee added with ID 2.",
+        "Employee Eve Fox added with ID 3.",
+        "Employee with name Ann Bee already exists.",
+    ]
+    assert (
+        employees.edit(employees.get(1), color="black") == "Employee Ann Bee updated."
+    )
+    assert employees.edit_many([(employees.get(2), {"name": "Cid D"})]) == [
+        "Employee Cid D updated."
+    ]
+    assert employees.remove(employees.get(3)) == "Employee Eve Fox removed."
+
+    open_database(backend)
+    assert [
+        (
+            employee.id,
+            employee.name,
+            employee.initials,
+            employee.color,
+            employee.version,
+        )
+        for employee in Employees().list
+    ] == [(1, "Ann Bee", "AB", "black", 1), (2, "Cid D", "CD", "blue", 1)]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_stores(open_database, backend):
+    open_database(backend)
+    stores = Stores()
+
+    assert stores.add("Main Street", "MS") == "Store Main Street added with ID 1."
+    assert stores.add_many([{"name": "Mall"}, {"name": "Main Street"}]) == [
+        "Store Mall added with ID 2.",
+        "Store with name Main Street already exists.",
+    ]
+    assert stores.edit(stores.get(2), name="Mall West") == "Store Mall West updated."
+
+    open_database(backend)
+    assert [
+        (store.id, store.name, store.initials, store.version) for store in Stores().list
+    ] == [(1, "Main Street", "MS", 0), (2, "Mall West", "MAL", 1)]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_stale_edits_conflict(open_database, backend):
+    open_database(backend)
+    add_staff()
+    employee = Employees().get(1)
+    store = Stores().get(2)
+
+    assert Employees().edit(employee, color="black") == "Employee Ann Bee updated."
+    assert Employees().edit(employee, color="white") == (
+        "Employee 1 changed since it was read."
+    )
+    assert Stores().edit(store, name="Mall West") == "Store Mall West updated."
+    assert (
+        Stores().edit(store, name="Mall East") == "Store 2 changed since it was read."
+    )
+    assert Employees().get(1).color == "black"
+    assert Stores().get(2).name == "Mall West"
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_duplicates_rejected(open_database, backend):
+    open_database(backend)
+    add_staff()
+    employees = Database().table("employees")
+    reports = Database().table("sales_reports")
+    reports.insert({"id": 1, "store": 1, "date": "2024-01-01"})
+
+    with pytest.raises(DuplicateError, match="^Employee with the same name "):
+        employees.insert({"id": 3, "name": "Ann Bee", "initials": "AB2"})
+    with pytest.raises(DuplicateError, match="^Employee with the same initials "):
+        employees.insert_multiple(
+            [
+                {"id": 3, "name": "Eve Fox", "initials": "EF"},
+                {"id": 4, "name": "Eve Fry", "initials": "EF"},
+            ]
+        )
+    with pytest.raises(DuplicateError, match="^Employee with the same color "):
+        employees.update(2, {"color": "red"})
+    with pytest.raises(
+        DuplicateError, match="^Sales report with the same store and date "
+    ):
+        reports.insert({"id": 2, "store": 1, "date": "2024-01-01"})
+
+    assert [employee["name"] for employee in employees.all()] == ["Ann Bee", "Cid Dee"]
+    assert employees.get(2)["color"] == "blue"
+    assert len(reports) == 1
+
+
+def test_reports_agree(open_database, monkeypatch):
+    results = {}
+    for backend in BACKENDS:
+        open_database(backend)
+        add_staff()
+        messages = open_and_close_reports(monkeypatch, days=10)
+
+        # Read everything back through a new handle
+        open_database(backend)
+        find = SalesReports().find
+        stores = Stores().list
+        results[backend] = {
+            "messages": messages,
+            "reports": [
+                describe(report) for report in SalesReports().sales_report_list
+            ],
+            "pages": [
+                [describe(report) for report in find(limit=6, offset=offset)]
+                for offset in range(0, 24, 6)
+            ],
+            "filtered": [
+                describe(report)
+                for report in find(
+                    store=stores[1],
+                    date_from=dt(2024, 1, 3),
+                    date_to=dt(2024, 1, 8),
+                    closed=True,
+                )
+            ],
+            "open": [report.id for report in find(closed=False)],
+            "rollups": [
+                (rollup.period, rollup.start, rollup.totals)
+                for store in stores
+                for period in PERIODS
+                for rollup in SalesRollups().find(store, period)
+            ],
+            "mismatches": SalesRollups().rebuild(),
+        }
+
+    assert results["tinydb"] == results["sqlite"]
+    assert len(results["sqlite"]["reports"]) == 20
+    assert results["sqlite"]["mismatches"] == []
+    assert [len(page) for page in results["sqlite"]["pages"]] == [6, 6, 6, 2]
+    assert results["sqlite"]["open"] == [5, 6, 11, 12, 17, 18]
+    assert "The store already closed." in results["sqlite"]["messages"]
+    assert "The store already opened today." in results["sqlite"]["messages"]
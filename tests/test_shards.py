@@ -0,0 +1,83 @@
+"""TinyDB keeps the tables that grow with the history out of the main file."""
+
+import json
+
+import pytest
+
+from databases import SalesReports, SalesRollups, Stores
+from databases.database import Database
+from models.sales_report import Counts, GiftCards, MoneyCount, Movements, MType
+from tests.test_backend_parity import add_staff, open_and_close_reports
+
+
+@pytest.fixture
+def database_path(tmp_path, monkeypatch):
+    """Path of a TinyDB database in ``tmp_path``, keeping the defaults."""
+    for attribute in ("path", "backend", "sharded"):
+        monkeypatch.setattr(Database, attribute, getattr(Database, attribute))
+    Database.close_all()
+    yield str(tmp_path / "database.json")
+    Database.close_all()
+
+
+def test_rollups_leave_main_file(database_path):
+    # Written by a version that kept the rollups in the main file
+    Database.open(database_path, backend="tinydb")
+    Stores().add("Main Street", "MS")
+    Database().db.table("sales_rollups").insert_multiple(
+        {
+            "id": id,
+            "store": 1,
+            "period": "day",
+            "start": f"2024-01-0{id}",
+            "totals": {"sales": id},
+        }
+        for id in (1, 2)
+    )
+    Database().flush()
+
+    Database.open(database_path, backend="tinydb")
+    assert [
+        (rollup.start.isoformat(), rollup.totals)
+        for rollup in SalesRollups().find(Stores().get(1), "day")
+    ] == [("2024-01-01", {"sales": 1}), ("2024-01-02", {"sales": 2})]
+    assert Database.get_next_id(Database().table("sales_rollups")) == 3
+    Database.close_all()
+
+    with open(database_path) as file:
+        assert "sales_rollups" not in json.load(file)
+
+
+def stamps(directory) -> dict[str, tuple[int, int, int]]:
+    """Inode, modification time and size of every file under the directory."""
+    return {
+        str(path.relative_to(directory)): (
+            path.stat().st_ino,
+            path.stat().st_mtime_ns,
+            path.stat().st_size,
+        )
+        for path in directory.rglob("*")
+        if path.is_file()
+    }
+
+
+def test_close_writes_only_its_shards(database_path, monkeypatch, tmp_path):
+    Database.open(database_path, backend="tinydb", sharded=True)
+    add_staff()
+    open_and_close_reports(monkeypatch, days=3)
+    report = next(SalesReports().find(store=Stores().get(2), closed=False))
+    before = stamps(tmp_path)
+
+    SalesReports().close(
+        report,
+        MoneyCount({"100": 1}, {"10": 3}),
+        Counts(3, GiftCards(1, 2)),
+        Movements(MType(0, 0.0), MType(0, 0.0), MType(0, 0.0)),
+        Movements(MType(2, 20.3), MType(1, 24.99), MType(0, 0.0)),
+    )
+    after = stamps(tmp_path)
+    assert sorted(path for path in after if after[path] != before.get(path)) == [
+        "database.json.shards/sales_reports/2-2024-01.json",
+        "database.json.shards/sales_rollups/2-2024-01.json",
+        "database.json.shards/sales_rollups/manifest.json",
+    ]
@@ -0,0 +1,38 @@
+"""The journal keeps every synced write when a writer crashes mid-record."""
+
+from tinydb import TinyDB
+
+from databases.storages import JournalStorage
+
+
+def numbers(db: TinyDB) -> list[int]:
+    return [row["n"] for row in db.table("numbers").all()]
+
+
+def test_torn_record_is_cut_off(tmp_path):
+    path = str(tmp_path / "database.json")
+    first = TinyDB(path, storage=JournalStorage)
+    second = TinyDB(path, storage=JournalStorage)
+    first.table("numbers").insert({"n": 1})
+
+    # Left by a process that crashed while appending
+    with open(f"{path}.journal", "ab") as journal:
+        journal.write(b'{"t": "numbers", "id": "9", "doc": {"n"')
+    first.table("numbers").insert({"n": 2})
+    second.table("numbers").insert({"n": 3})
+    assert numbers(first) == numbers(second) == [1, 2, 3]
+    first.close()
+    second.close()
+
+    assert numbers(TinyDB(path, storage=JournalStorage)) == [1, 2, 3]
+
+
+def test_bad_record_is_skipped(tmp_path):
+    path = str(tmp_path / "database.json")
+    with open(f"{path}.journal", "wb") as journal:
+        journal.write(
+            b'{"t": "numbers", "id": "1", "doc": {"n": 1}}\n'
+            b'{"t": "numbers", "id": "9", "doc": {"n"\n'
+            b'{"t": "numbers", "id": "2", "doc": {"n": 2}}\n'
+        )
+    assert numbers(TinyDB(path, storage=JournalStorage)) == [1, 2]